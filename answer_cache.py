@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: answer_cache.py
+# 图谱查询结果缓存：容量有限的LRU，条目带过期时间，图谱重建后整体失效，可跨线程使用
+
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+from file_util import atomic_write
+
+cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+# 图谱版本标记文件，MedicalGraph每次导入完成后改写，各进程的缓存据此失效
+GRAPH_VERSION_PATH = os.path.join(cur_dir, 'data/graph.version')
+
+# 本进程内存活的缓存，图谱在本进程内重建时直接逐个清空
+live_caches = weakref.WeakSet()
+
+
+def read_graph_version(path=GRAPH_VERSION_PATH):
+    """读取图谱版本标记，文件不存在时返回None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def bump_graph_version(path=GRAPH_VERSION_PATH):
+    """图谱重建后调用：写入新的版本标记，并清空本进程内的全部缓存"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    version = uuid.uuid4().hex
+    with atomic_write(path) as f:
+        f.write(version)
+    for cache in list(live_caches):
+        cache.clear()
+    return version
+
+
+def normalize_entity(entity):
+    """缓存键中的实体名归一化：只去掉首尾空白，不改大小写，图谱按name精确匹配，大小写不同的实体答案可能不同"""
+    return entity.strip()
+
+
+class AnswerCache:
+    """以(question_type, 实体)为键的LRU缓存，每个条目有独立的过期时间；clock为单调时钟，测试时可替换"""
+    def __init__(self, maxsize=10000, ttl=600, version_path=GRAPH_VERSION_PATH, check_interval=1.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version_path = version_path
+        self.check_interval = check_interval
+        self.clock = clock
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.version = read_graph_version(version_path)
+        self.next_check = clock() + check_interval
+        live_caches.add(self)
+
+    @staticmethod
+    def make_key(question_type, entity):
+        return question_type, normalize_entity(entity)
+
+    def check_version(self, now):
+        """按间隔检查图谱版本标记，其它进程重建图谱后清空缓存；需持有锁"""
+        self.next_check = now + self.check_interval
+        version = read_graph_version(self.version_path)
+        if version != self.version:
+            self.version = version
+            self.data.clear()
+            self.invalidations += 1
+
+    def get(self, key, default=None):
+        now = self.clock()
+        with self.lock:
+            if now >= self.next_check:
+                self.check_version(now)
+            item = self.data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expire_at, value = item
+            if expire_at <= now:
+                del self.data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        now = self.clock()
+        expire_at = now + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+            self.data[key] = (expire_at, value)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self.data)
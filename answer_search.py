@@ -4,133 +4,186 @@
 # Author: lhy<lhy_in_blcu@126.com,https://huangyong.github.io>
 # Date: 18-10-5
 
-from py2neo import Graph
+from answer_cache import AnswerCache
+from graph_client import get_graph_client
+from question_parser import BATCH_TEMPLATES, CYPHER_TEMPLATES, QUESTION_TEMPLATES
+from question_types import QUESTION_TYPES
+from tracing import TRACER
+
+
+def compile_answer_template(template, subject_column, slots):
+    """把一条回复模板编译成render(answers, limit)：只遍历结果行一遍，按首次出现的顺序去重，
+    槽位取满limit个值后不再处理后面的行；值为None的结果(属性缺失)跳过"""
+    if len(slots) == 1 and slots[0]['where'] is None:
+        spec = slots[0]
+        sep = spec['sep']
+        if len(spec['columns']) == 1 and not (spec['join'] or spec['exclude_subject']):
+            # 绝大多数问题类型：单列取值，不做任何转换
+            column = spec['columns'][0]
+
+            def render(answers, limit):
+                values = {}
+                for row in answers:
+                    if len(values) >= limit:
+                        break
+                    value = row[column]
+                    if value is not None and value not in values:
+                        values[value] = None
+                return template.format(sep.join(values), subject=answers[0][subject_column])
+            return render
+
+        columns, join, exclude_subject = spec['columns'], spec['join'], spec['exclude_subject']
+
+        def render(answers, limit):
+            subject = answers[0][subject_column]
+            values = {}
+            for row in answers:
+                if len(values) >= limit:
+                    break
+                for column in columns:
+                    value = row[column]
+                    if value is None:
+                        continue
+                    if join is not None:
+                        value = join.join(value)
+                    if value not in values and not (exclude_subject and value == subject):
+                        values[value] = None
+                        if len(values) >= limit:
+                            break
+            return template.format(sep.join(values), subject=subject)
+        return render
+
+    if all(spec['where'] is not None and len(spec['columns']) == 1 and not (spec['join'] or spec['exclude_subject'])
+           for spec in slots):
+        # 按关系名分流到不同槽位(如宜吃/推荐食谱)
+        routes = {spec['where']: i for i, spec in enumerate(slots)}
+        columns = [spec['columns'][0] for spec in slots]
+        seps = [spec['sep'] for spec in slots]
+
+        def render(answers, limit):
+            groups = [{} for _ in slots]
+            remaining = len(slots) if limit > 0 else 0
+            for row in answers:
+                if not remaining:
+                    break
+                i = routes.get(row['r.name'])
+                if i is None:
+                    continue
+                values = groups[i]
+                value = row[columns[i]]
+                if len(values) < limit and value is not None and value not in values:
+                    values[value] = None
+                    if len(values) == limit:
+                        remaining -= 1
+            return template.format(*[sep.join(values) for sep, values in zip(seps, groups)], subject=answers[0][subject_column])
+        return render
+
+    raise ValueError('unsupported answer template: %s' % template)
+
+
+# 问题类型 -> 由注册表中的回复模板编译好的回复函数
+ANSWER_RENDERERS = {name: compile_answer_template(*question_type.answer) for name, question_type in QUESTION_TYPES.items()}
 
 class AnswerSearcher:
-    def __init__(self):
-        self.g = Graph(
-            host="127.0.0.1",
-            http_port=7474,
-            user="lhy",
-            password="lhy123")
+    def __init__(self, graph=None, batch=False, cache=None):
+        # 默认使用本进程共享的图谱客户端(Bolt连接池)，也可传入任何提供run(cypher, parameters)的对象
+        if graph is None:
+            graph = get_graph_client()
+        self.g = graph
+        # 取结果行：GraphClient.data把发出查询与取结果整体放在重试范围内；只提供run()的对象退回run(...).data()
+        fetch = getattr(graph, 'data', None)
+        self.fetch = fetch if fetch is not None else lambda cypher, params: graph.run(cypher, params).data()
+        # 批量模式：每类问题的全部实体与关系合并为一条UNWIND查询
+        self.batch = batch
+        # 查询结果缓存(AnswerCache)，按(问题类型, 实体)缓存图谱返回的原始结果行
+        self.cache = cache
         self.num_limit = 20
 
-    '''执行cypher查询，并返回相应结果'''
+    '''执行参数化的cypher查询，并返回相应结果'''
     def search_main(self, sqls):
         final_answers = []
         for sql_ in sqls:
-            question_type = sql_['question_type']
-            queries = sql_['sql']
-            answers = []
-            for query in queries:
-                ress = self.g.run(query).data()
-                answers += ress
-            final_answer = self.answer_prettify(question_type, answers)
+            final_answer = self.search_one(sql_)
             if final_answer:
                 final_answers.append(final_answer)
         return final_answers
 
+    '''查询并生成一类问题的回复，各类问题之间互不依赖，可并发调用'''
+    def search_one(self, sql_):
+        if TRACER.enabled:
+            return self.search_one_traced(sql_)
+        answers = self.search_rows(sql_)
+        return self.answer_prettify(sql_['question_type'], answers)
+
+    '''search_one的计时版本，分别记录查询与生成回复的耗时'''
+    def search_one_traced(self, sql_):
+        question_type = sql_['question_type']
+        with TRACER.stage('search', question_type):
+            answers = self.search_rows(sql_)
+        with TRACER.stage('prettify', question_type):
+            return self.answer_prettify(question_type, answers)
+
+    '''执行一条图谱查询，query_id为模板名(批量查询为batch:问题类型)，用于分查询计时'''
+    def run_query(self, query_id, cypher, params):
+        if not TRACER.enabled:
+            return self.fetch(cypher, params)
+        with TRACER.stage('query', query_id):
+            return self.fetch(cypher, params)
+
+    '''查询一类问题的全部结果行，批量模式下一次往返，结果行顺序与逐条查询一致'''
+    def search_rows(self, sql_):
+        question_type = sql_['question_type']
+        entities = sql_.get('entities')
+        if not entities or question_type not in QUESTION_TEMPLATES:
+            answers = []
+            for template_id, params in sql_['sql']:
+                answers += self.run_query(template_id, CYPHER_TEMPLATES[template_id], params)
+            return answers
+        if self.cache is None:
+            entity_parts = self.fetch_entity_parts(question_type, entities)
+        else:
+            # 先按实体查缓存，只有未命中的实体才查询图谱
+            entity_parts = {}
+            misses = []
+            for entity in entities:
+                parts = self.cache.get(AnswerCache.make_key(question_type, entity))
+                if parts is None:
+                    misses.append(entity)
+                else:
+                    entity_parts[entity] = parts
+            if misses:
+                fetched = self.fetch_entity_parts(question_type, misses)
+                for entity in misses:
+                    self.cache.put(AnswerCache.make_key(question_type, entity), fetched[entity])
+                entity_parts.update(fetched)
+        # 按(模板, 实体)的顺序拼回结果行
+        answers = []
+        for part in range(len(QUESTION_TEMPLATES[question_type])):
+            for entity in entities:
+                answers += entity_parts[entity][part]
+        return answers
+
+    '''查询若干实体的结果行，按实体、模板分组返回：{实体: [模板1的结果行, 模板2的结果行, ...]}'''
+    def fetch_entity_parts(self, question_type, entities):
+        template_ids = QUESTION_TEMPLATES[question_type]
+        entity_parts = {entity: [[] for _ in template_ids] for entity in entities}
+        if self.batch:
+            for row in self.run_query('batch:' + question_type, BATCH_TEMPLATES[question_type], {'names': entities}):
+                entity_parts[row['name']][row.get('part', 0)].append(row)
+        else:
+            for part, template_id in enumerate(template_ids):
+                for entity in entities:
+                    entity_parts[entity][part] += self.run_query(template_id, CYPHER_TEMPLATES[template_id], {'name': entity})
+        return entity_parts
+
     '''根据对应的qustion_type，调用相应的回复模板'''
     def answer_prettify(self, question_type, answers):
-        final_answer = []
         if not answers:
             return ''
-        if question_type == 'disease_symptom':
-            desc = [i['n.name'] for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0}的症状包括：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'symptom_disease':
-            desc = [i['m.name'] for i in answers]
-            subject = answers[0]['n.name']
-            final_answer = '症状{0}可能染上的疾病有：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_cause':
-            desc = [i['m.cause'] for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0}可能的成因有：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_prevent':
-            desc = [i['m.prevent'] for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0}的预防措施包括：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_lasttime':
-            desc = [i['m.cure_lasttime'] for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0}治疗可能持续的周期为：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_cureway':
-            desc = [';'.join(i['m.cure_way']) for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0}可以尝试如下治疗：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_cureprob':
-            desc = [i['m.cured_prob'] for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0}治愈的概率为（仅供参考）：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_easyget':
-            desc = [i['m.easy_get'] for i in answers]
-            subject = answers[0]['m.name']
-
-            final_answer = '{0}的易感人群包括：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_desc':
-            desc = [i['m.desc'] for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0},熟悉一下：{1}'.format(subject,  '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_acompany':
-            desc1 = [i['n.name'] for i in answers]
-            desc2 = [i['m.name'] for i in answers]
-            subject = answers[0]['m.name']
-            desc = [i for i in desc1 + desc2 if i != subject]
-            final_answer = '{0}的症状包括：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_not_food':
-            desc = [i['n.name'] for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0}忌食的食物包括有：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_do_food':
-            do_desc = [i['n.name'] for i in answers if i['r.name'] == '宜吃']
-            recommand_desc = [i['n.name'] for i in answers if i['r.name'] == '推荐食谱']
-            subject = answers[0]['m.name']
-            final_answer = '{0}宜食的食物包括有：{1}\n推荐食谱包括有：{2}'.format(subject, ';'.join(list(set(do_desc))[:self.num_limit]), ';'.join(list(set(recommand_desc))[:self.num_limit]))
-
-        elif question_type == 'food_not_disease':
-            desc = [i['m.name'] for i in answers]
-            subject = answers[0]['n.name']
-            final_answer = '患有{0}的人最好不要吃{1}'.format('；'.join(list(set(desc))[:self.num_limit]), subject)
-
-        elif question_type == 'food_do_disease':
-            desc = [i['m.name'] for i in answers]
-            subject = answers[0]['n.name']
-            final_answer = '患有{0}的人建议多试试{1}'.format('；'.join(list(set(desc))[:self.num_limit]), subject)
-
-        elif question_type == 'disease_drug':
-            desc = [i['n.name'] for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0}通常的使用的药品包括：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'drug_disease':
-            desc = [i['m.name'] for i in answers]
-            subject = answers[0]['n.name']
-            final_answer = '{0}主治的疾病有{1},可以试试'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'disease_check':
-            desc = [i['n.name'] for i in answers]
-            subject = answers[0]['m.name']
-            final_answer = '{0}通常可以通过以下方式检查出来：{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        elif question_type == 'check_disease':
-            desc = [i['m.name'] for i in answers]
-            subject = answers[0]['n.name']
-            final_answer = '通常可以通过{0}检查出来的疾病有{1}'.format(subject, '；'.join(list(set(desc))[:self.num_limit]))
-
-        return final_answer
-
+        render = ANSWER_RENDERERS.get(question_type)
+        if render is None:
+            return ''
+        return render(answers, self.num_limit)
 
 if __name__ == '__main__':
     searcher = AnswerSearcher()
\ No newline at end of file
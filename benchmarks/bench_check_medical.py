@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: bench_check_medical.py
+# check_medical重叠消解微基准：长文本、实体密集输入下 span 与 substring 两种方式对比
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from question_classifier import QuestionClassifier
+
+
+def build_inputs(n_words, count, seed):
+    """用词典词拼出实体密集的长文本，疾病/症状词之间大量存在子串重叠"""
+    rnd = random.Random(seed)
+    words = []
+    for name in ('disease', 'symptom', 'drug', 'food', 'check'):
+        with open(os.path.join(ROOT, 'dict', '%s.txt' % name), encoding='utf-8') as f:
+            words += [i.strip() for i in f if i.strip()]
+    return [''.join(rnd.choice(words) for _ in range(n_words)) for _ in range(count)]
+
+
+def bench(func, inputs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for sent in inputs:
+            func(sent)
+        cost = (time.perf_counter() - start) / len(inputs)
+        best = cost if best is None else min(best, cost)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='check_medical overlap resolution microbenchmark')
+    parser.add_argument('--sizes', default='10,50,200,1000', help='每条输入包含的词典词个数')
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    span = QuestionClassifier(overlap_mode='span')
+    substring = QuestionClassifier(overlap_mode='substring')
+
+    print('%8s %10s %14s %14s %8s' % ('words', 'matches', 'substring(us)', 'span(us)', 'speedup'))
+    for n_words in [int(i) for i in args.sizes.split(',')]:
+        inputs = build_inputs(n_words, args.count, args.seed)
+        matches = sum(len(list(span.region_tree.iter(i))) for i in inputs) // len(inputs)
+        cost_sub = bench(substring.check_medical, inputs, args.repeat)
+        cost_span = bench(span.check_medical, inputs, args.repeat)
+        print('%8d %10d %14.1f %14.1f %7.1fx' % (n_words, matches, cost_sub * 1e6, cost_span * 1e6, cost_sub / cost_span))
+
+
+if __name__ == '__main__':
+    main()
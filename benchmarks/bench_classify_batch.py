@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: bench_classify_batch.py
+# 逐句classify与classify_batch吞吐对比，语料按日志的长尾分布生成
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from question_classifier import QuestionClassifier
+
+TEMPLATES = ['{}的症状有哪些？', '{}是什么原因引起的', '得了{}不能吃什么', '{}要多久才能好', '请问{}怎么治疗比较好',
+             '{}', '{}吃什么药', '{}会传染吗，什么人容易得', '{}要做哪些检查', '最近总是{}，怎么办']
+
+
+def build_corpus(n, seed, skew):
+    """疾病按Zipf分布抽取，模拟少数常见病占大部分流量"""
+    rnd = random.Random(seed)
+    with open(os.path.join(ROOT, 'dict', 'disease.txt'), encoding='utf-8') as f:
+        diseases = [i.strip() for i in f if i.strip()]
+    rnd.shuffle(diseases)
+    weights = [1.0 / (rank + 1) ** skew for rank in range(len(diseases))]
+    picks = rnd.choices(diseases, weights=weights, k=n)
+    return [rnd.choice(TEMPLATES).format(disease) for disease in picks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='classify vs classify_batch throughput')
+    parser.add_argument('--n', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=20000)
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf指数，0为均匀分布')
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.n, args.seed, args.skew)
+    handler = QuestionClassifier()
+
+    start = time.perf_counter()
+    expected = [handler.classify(question) for question in corpus]
+    loop_cost = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(corpus), args.batch_size):
+        results += handler.classify_batch(corpus[i:i + args.batch_size])
+    batch_cost = time.perf_counter() - start
+
+    assert results == expected, 'classify_batch output differs from classify'
+    print('questions: %d, distinct: %d, batch size: %d' % (len(corpus), len(set(corpus)), args.batch_size))
+    print('%-16s %10.2fs %12.0f q/s' % ('classify loop', loop_cost, len(corpus) / loop_cost))
+    print('%-16s %10.2fs %12.0f q/s' % ('classify_batch', batch_cost, len(corpus) / batch_cost))
+    print('speedup: %.1fx' % (loop_cost / batch_cost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: bench_medical_entities.py
+# 独立部署版MedicalQuestionClassifier.check_medical每问句延迟：逐词子串查找(改造前) 与 共享自动机抽取 对比
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import entity_extractor
+from entity_extractor import EntityExtractor, PyAutomaton
+from medical_qa_system import MedicalQuestionClassifier
+
+TEMPLATES = ['{}的症状有哪些？', '为什么会得{}？', '{}怎么治疗？', '{}要多久才能好？', '{}是什么', '得了{}吃{}有用吗',
+             '{}和{}有什么关系', '{}患者能吃{}吗', '{}需要做{}吗']
+
+
+def substring_check_medical(classifier, question):
+    """改造前的实现：疾病、症状词表逐个做子串查找"""
+    medical_dict = {}
+    for disease in classifier.disease_words:
+        if disease in question:
+            medical_dict.setdefault('disease', []).append(disease)
+    for symptom in classifier.symptom_words:
+        if symptom in question:
+            medical_dict.setdefault('symptom', []).append(symptom)
+    return medical_dict
+
+
+def build_questions(classifier, count, seed):
+    """词典词套入问句模板；每条问句在第一个槽位放疾病或症状，其余槽位从全部类型中随机取"""
+    rnd = random.Random(seed)
+    words = classifier.disease_words + classifier.symptom_words + classifier.drug_words + \
+        classifier.food_words + classifier.check_words
+    questions = []
+    for _ in range(count):
+        template = rnd.choice(TEMPLATES)
+        slots = template.count('{}')
+        first = rnd.choice(classifier.disease_words if rnd.random() < 0.7 else classifier.symptom_words)
+        questions.append(template.format(first, *[rnd.choice(words) for _ in range(slots - 1)]))
+    return questions
+
+
+def bench(func, inputs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for question in inputs:
+            func(question)
+        cost = (time.perf_counter() - start) / len(inputs)
+        best = cost if best is None else min(best, cost)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MedicalQuestionClassifier.check_medical per-question latency')
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    classifier = MedicalQuestionClassifier()
+    questions = build_questions(classifier, args.count, args.seed)
+    words_by_type = {'disease': classifier.disease_words, 'symptom': classifier.symptom_words,
+                     'drug': classifier.drug_words, 'food': classifier.food_words, 'check': classifier.check_words}
+
+    rows = [('substring', lambda q: substring_check_medical(classifier, q), None)]
+    # 装有pyahocorasick时再单独测纯Python自动机，两者结果应一致
+    backends = [('automaton(py)', PyAutomaton)]
+    if entity_extractor.pyahocorasick is not None:
+        backends.insert(0, ('automaton(c)', entity_extractor.pyahocorasick.Automaton))
+    for name, factory in backends:
+        original = entity_extractor.new_automaton
+        entity_extractor.new_automaton = factory
+        start = time.perf_counter()
+        try:
+            extractor = EntityExtractor(words_by_type)
+        finally:
+            entity_extractor.new_automaton = original
+        rows.append((name, extractor.extract, time.perf_counter() - start))
+
+    extractors = [func for _, func, _ in rows[1:]]
+    mismatches = sum(len({repr(extract(q)) for extract in extractors}) > 1 for q in questions)
+
+    print('%d questions, %d dictionary words, backend mismatches: %d' % (
+        len(questions), sum(len(i) for i in words_by_type.values()), mismatches))
+    print('%-14s %10s %12s %8s' % ('method', 'build(ms)', 'per-q(us)', 'speedup'))
+    base = None
+    for name, func, build in rows:
+        cost = bench(func, questions, args.repeat)
+        base = cost if base is None else base
+        print('%-14s %10s %12.1f %7.1fx' % (name, '-' if build is None else '%.0f' % (build * 1e3), cost * 1e6, base / cost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: bench_search_batch.py
+# AnswerSearcher逐条查询与UNWIND批量查询的延迟对比，图数据库以固定往返延迟的本地替身模拟
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from answer_search import AnswerSearcher
+from question_classifier import QuestionClassifier
+from question_parser import QuestionPaser
+
+
+class Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return self.rows
+
+
+class LatencyGraph:
+    """本地Neo4j替身：每次run固定往返延迟加按行计的服务端耗时，返回列名与真实查询一致的结果行"""
+    def __init__(self, rtt, row_cost, rows_per_entity):
+        self.rtt = rtt
+        self.row_cost = row_cost
+        self.rows_per_entity = rows_per_entity
+        self.round_trips = 0
+
+    def run(self, cypher, parameters=None):
+        self.round_trips += 1
+        names = parameters.get('names') or [parameters['name']]
+        returns = cypher.rsplit(' return ', 1)[1].split(' ORDER BY ')[0]
+        columns = [re.sub(r'^.* AS ', '', i.strip()).strip('`') for i in returns.split(',')]
+        parts = cypher.count(' UNION ALL ') + 1
+        rows = []
+        for part in range(parts):
+            for i, name in enumerate(names):
+                for k in range(self.rows_per_entity):
+                    row = {column: '%s_%d_%d' % (name, part, k) for column in columns}
+                    row.update({'i': i, 'name': name, 'part': part} if 'names' in parameters else {})
+                    rows.append(row)
+        for row in rows:
+            for column in ('m.name', 'n.name'):
+                if column in row:
+                    row[column] = row.get('name', names[0])
+            if 'm.cure_way' in row:
+                row['m.cure_way'] = [row['m.cure_way']]
+        time.sleep(self.rtt + self.row_cost * len(rows))
+        return Cursor(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AnswerSearcher sequential vs UNWIND batch latency')
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--rtt-ms', type=float, default=0.5, help='每次往返的固定延迟')
+    parser.add_argument('--row-us', type=float, default=2.0, help='服务端每行耗时')
+    parser.add_argument('--rows', type=int, default=5, help='每个实体每条关系返回的行数')
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    with open(os.path.join(ROOT, 'dict', 'disease.txt'), encoding='utf-8') as f:
+        diseases = [i.strip() for i in f if i.strip()]
+    classifier = QuestionClassifier()
+    question_parser = QuestionPaser()
+    questions = ['%s、%s和%s吃什么好，用什么药，有哪些并发症' % tuple(rnd.sample(diseases, 3)) for _ in range(args.questions)]
+    sqls_list = [question_parser.parser_main(classifier.classify(question)) for question in questions]
+
+    print('%-10s %12s %14s %14s' % ('mode', 'round trips', 'ms/question', 'p95(ms)'))
+    for batch in (False, True):
+        graph = LatencyGraph(args.rtt_ms / 1000.0, args.row_us / 1e6, args.rows)
+        searcher = AnswerSearcher(graph=graph, batch=batch)
+        costs = []
+        for sqls in sqls_list:
+            start = time.perf_counter()
+            searcher.search_main(sqls)
+            costs.append(time.perf_counter() - start)
+        costs.sort()
+        print('%-10s %12.1f %14.2f %14.2f' % ('batch' if batch else 'sequential', graph.round_trips / len(sqls_list),
+                                            sum(costs) / len(costs) * 1000, costs[int(len(costs) * 0.95)] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: bench_startup.py
+# QuestionClassifier启动耗时对比：冷构建 vs 读取词典快照
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_classifier import QuestionClassifier
+
+
+def timeit(func, repeat):
+    costs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        costs.append(time.perf_counter() - start)
+    return min(costs), sum(costs) / len(costs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QuestionClassifier startup benchmark')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # 先确保快照存在且新鲜
+    QuestionClassifier(rebuild_snapshot=True)
+
+    cold_best, cold_mean = timeit(lambda: QuestionClassifier(use_snapshot=False), args.repeat)
+    snap_best, snap_mean = timeit(lambda: QuestionClassifier(), args.repeat)
+
+    print('%-16s %10s %10s' % ('mode', 'best(s)', 'mean(s)'))
+    print('%-16s %10.3f %10.3f' % ('cold build', cold_best, cold_mean))
+    print('%-16s %10.3f %10.3f' % ('snapshot load', snap_best, snap_mean))
+    print('speedup: %.1fx' % (cold_mean / snap_mean))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: run_benchmarks.py
+# 问答流水线基准：由dict/*.txt与问题类型注册表中的疑问词按固定种子生成问句集和模拟疾病数据，
+# 测量启动、分类、解析、内存图谱查询与端到端的逐次延迟(p50/p95/p99)与吞吐，结果写成JSON便于跨提交比较
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from answer_search import AnswerSearcher
+from chatbot_graph import ChatBotGraph
+from memory_graph import MemoryGraph
+from question_classifier import QuestionClassifier
+from question_parser import QuestionPaser
+from question_types import CUE_WORDS
+from tracing import TRACER
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+ENTITY_TYPES = ('disease', 'symptom', 'drug', 'food', 'check', 'department', 'producer')
+# 问句中使用的疑问词类别，按问题类型注册表中的登记顺序
+CUE_TYPES = tuple(CUE_WORDS)
+FILLERS = ('', '', '请问', '我想知道', '医生，', '最近')
+
+
+def load_words(name):
+    with open(os.path.join(ROOT, 'dict', '%s.txt' % name), encoding='utf-8') as f:
+        return [i.strip() for i in f if i.strip()]
+
+
+def build_records(words, count, seed):
+    """按固定种子生成medical.json格式的疾病记录，关系端点均取自词典"""
+    rnd = random.Random(seed)
+    names = rnd.sample(words['disease'], min(count, len(words['disease'])))
+    records = []
+    for name in names:
+        record = {'name': name, 'desc': '%s的介绍' % name, 'prevent': '%s的预防' % name, 'cause': '%s的成因' % name,
+                  'get_prob': '0.1%', 'easy_get': '无特定人群', 'cure_way': ['药物治疗', '手术治疗'][:rnd.randint(1, 2)],
+                  'cure_lasttime': '%d周' % rnd.randint(1, 12), 'cured_prob': '%d%%' % rnd.randint(30, 99),
+                  'cure_department': rnd.sample(words['department'], rnd.randint(1, 2))}
+        record['symptom'] = rnd.sample(words['symptom'], rnd.randint(1, 8))
+        if rnd.random() < 0.7:
+            record['acompany'] = rnd.sample(names, rnd.randint(1, 3))
+        if rnd.random() < 0.8:
+            record['common_drug'] = rnd.sample(words['drug'], rnd.randint(1, 4))
+            record['recommand_drug'] = rnd.sample(words['drug'], rnd.randint(0, 4))
+        if rnd.random() < 0.7:
+            record['not_eat'] = rnd.sample(words['food'], rnd.randint(1, 4))
+            record['do_eat'] = rnd.sample(words['food'], rnd.randint(1, 4))
+            record['recommand_eat'] = rnd.sample(words['food'], rnd.randint(1, 4))
+        if rnd.random() < 0.8:
+            record['check'] = rnd.sample(words['check'], rnd.randint(1, 4))
+        if rnd.random() < 0.5:
+            record['drug_detail'] = ['%s(%s)' % (rnd.choice(words['producer']), rnd.choice(words['drug']))
+                                     for _ in range(rnd.randint(1, 3))]
+        records.append(record)
+    return records
+
+
+def build_questions(words, classifier, records, count, seed):
+    """问句 = 可选的引导语 + 0~2个实体 + 0~2类疑问词(偶尔带否定词)；实体七成取自模拟数据中存在的节点"""
+    rnd = random.Random(seed + 1)
+    known = {
+        'disease': [record['name'] for record in records],
+        'symptom': sorted({i for record in records for i in record.get('symptom', [])}),
+        'food': sorted({i for record in records for i in record.get('do_eat', []) + record.get('not_eat', [])}),
+        'drug': sorted({i for record in records for i in record.get('common_drug', [])}),
+        'check': sorted({i for record in records for i in record.get('check', [])}),
+    }
+    questions = []
+    for _ in range(count):
+        parts = [rnd.choice(FILLERS)]
+        for _ in range(rnd.choice((0, 1, 1, 1, 1, 1, 1, 1, 2, 2))):
+            entity_type = rnd.choice(('disease', 'disease', 'disease', 'symptom', 'food', 'drug', 'check',
+                                      'department', 'producer'))
+            pool = known.get(entity_type) if rnd.random() < 0.7 else None
+            parts.append(rnd.choice(pool or words[entity_type]))
+        for _ in range(rnd.choice((0, 1, 1, 1, 2))):
+            if rnd.random() < 0.1:
+                parts.append(rnd.choice(classifier.deny_words))
+            parts.append(rnd.choice(CUE_WORDS[rnd.choice(CUE_TYPES)]))
+        questions.append(''.join(parts) + rnd.choice(('？', '?', '', '呢')))
+    return questions
+
+
+def percentile(sorted_samples, q):
+    """最近秩法分位数"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples), max(1, math.ceil(q * len(sorted_samples)))) - 1
+    return sorted_samples[index]
+
+
+def summarize(samples):
+    """samples为逐次耗时(秒)"""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'count': len(ordered),
+        'mean_us': total / len(ordered) * 1e6,
+        'p50_us': percentile(ordered, 0.50) * 1e6,
+        'p95_us': percentile(ordered, 0.95) * 1e6,
+        'p99_us': percentile(ordered, 0.99) * 1e6,
+        'ops_per_sec': len(ordered) / total if total else 0.0,
+    }
+
+
+def measure(func, inputs, rounds, warmup=True):
+    """逐个输入计时，预热一轮后测rounds轮"""
+    clock = time.perf_counter
+    if warmup:
+        for item in inputs:
+            func(item)
+    samples = []
+    for _ in range(rounds):
+        for item in inputs:
+            start = clock()
+            func(item)
+            samples.append(clock() - start)
+    return samples
+
+
+def measure_once(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return revision, bool(dirty)
+
+
+def print_results(results, baseline=None):
+    header = '%-16s %8s %10s %10s %10s %10s %12s' % ('benchmark', 'count', 'mean(us)', 'p50(us)', 'p95(us)',
+                                                      'p99(us)', 'ops/sec')
+    if baseline:
+        header += ' %9s' % 'vs base'
+    print(header)
+    for name, stats in results.items():
+        line = '%-16s %8d %10.1f %10.1f %10.1f %10.1f %12.1f' % (
+            name, stats['count'], stats['mean_us'], stats['p50_us'], stats['p95_us'], stats['p99_us'],
+            stats['ops_per_sec'])
+        base = (baseline or {}).get(name)
+        if base and stats['p50_us']:
+            # >1表示比基线快
+            line += ' %8.2fx' % (base['p50_us'] / stats['p50_us'])
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='QA pipeline benchmark suite')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--questions', type=int, default=2000, help='问句集大小')
+    parser.add_argument('--records', type=int, default=3000, help='模拟疾病记录数')
+    parser.add_argument('--data', help='使用真实的medical.json代替模拟数据')
+    parser.add_argument('--rounds', type=int, default=3, help='每项逐问句基准的测量轮数')
+    parser.add_argument('--startup-repeat', type=int, default=3)
+    parser.add_argument('--out', help='结果文件，默认benchmarks/results/<提交号>.json')
+    parser.add_argument('--compare', help='与之前的结果文件比较p50')
+    args = parser.parse_args()
+
+    # 基准测的是未开启追踪的路径
+    TRACER.disable()
+    words = {name: load_words(name) for name in ENTITY_TYPES}
+    results = {}
+
+    # 启动：分类器冷构建/读快照，内存图谱构建
+    QuestionClassifier(rebuild_snapshot=True)
+    results['startup_cold'] = summarize(measure_once(lambda: QuestionClassifier(use_snapshot=False), args.startup_repeat))
+    results['startup_snapshot'] = summarize(measure_once(QuestionClassifier, args.startup_repeat))
+    classifier = QuestionClassifier()
+    question_parser = QuestionPaser()
+
+    if args.data:
+        data_path = args.data
+        with open(data_path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    else:
+        records = build_records(words, args.records, args.seed)
+        fd, data_path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    try:
+        graph_samples = measure_once(lambda: MemoryGraph.from_json(data_path), args.startup_repeat)
+        results['startup_graph'] = summarize(graph_samples)
+        graph = MemoryGraph.from_json(data_path)
+    finally:
+        if not args.data:
+            os.remove(data_path)
+
+    questions = build_questions(words, classifier, records, args.questions, args.seed)
+    classified = [classifier.classify(question) for question in questions]
+    parsed = [question_parser.parser_main(res) for res in classified if res]
+    searcher = AnswerSearcher(graph=graph)
+    batch_searcher = AnswerSearcher(graph=graph, batch=True)
+    bot = ChatBotGraph(classifier=classifier, parser=question_parser, searcher=searcher)
+
+    results['classify'] = summarize(measure(classifier.classify, questions, args.rounds))
+    results['parse'] = summarize(measure(question_parser.parser_main, [res for res in classified if res], args.rounds))
+    results['search'] = summarize(measure(searcher.search_main, parsed, args.rounds))
+    results['search_batch'] = summarize(measure(batch_searcher.search_main, parsed, args.rounds))
+    results['end_to_end'] = summarize(measure(bot.chat_main, questions, args.rounds))
+
+    revision, dirty = git_revision()
+    report = {
+        'meta': {
+            'revision': revision,
+            'dirty': dirty,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'questions': len(questions),
+            # 问句集指纹：相同的种子与词典应得到相同的值，不同时结果不可直接比较
+            'corpus_sha1': hashlib.sha1('\n'.join(questions).encode('utf-8')).hexdigest(),
+            'with_entities': sum(1 for res in classified if res),
+            'records': len(records),
+            'data': args.data or 'synthetic',
+            'rounds': args.rounds,
+        },
+        'results': results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, '%s%s.json' % (revision or 'unknown', '-dirty' if dirty else ''))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+    print('results written to %s' % out)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,268 +5,205 @@
 # Date: 18-10-3
 
 import os
-import json
-from py2neo import Graph,Node
+import sys
+import time
+import argparse
+from answer_cache import bump_graph_version
+from graph_client import get_graph_client
+from medical_reader import DISEASE_KEYS, NODE_LABELS, REL_SPECS, read_medical
+
+class ProgressMeter:
+    """导入进度：同一行刷新已完成数、总数与速率，最多每interval秒输出一次"""
+    def __init__(self, label, total=None, interval=0.5, stream=sys.stderr):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.start = time.perf_counter()
+        self.last = 0.0
+
+    def update(self, n=1):
+        self.done += n
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.render(now)
+
+    def render(self, now, end='\r'):
+        cost = now - self.start
+        total = '/%d' % self.total if self.total is not None else ''
+        self.stream.write('%s: %d%s, %.1fs, %.0f/s%s' % (self.label, self.done, total, cost, self.done / cost if cost else 0, end))
+        self.stream.flush()
+
+    def finish(self):
+        self.render(time.perf_counter(), end='\n')
+        return time.perf_counter() - self.start
+
+
+# 在:Label(name)上建唯一约束或索引的语句，依次尝试Neo4j 5/4.4、Neo4j 4.x的约束语法，name有重复时退为普通索引
+NAME_SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT IF NOT EXISTS FOR (n:%s) REQUIRE n.name IS UNIQUE",
+    "CREATE CONSTRAINT IF NOT EXISTS ON (n:%s) ASSERT n.name IS UNIQUE",
+    "CREATE INDEX IF NOT EXISTS FOR (n:%s) ON (n.name)",
+]
+
+
+def iter_batches(items, batch_size):
+    """把可迭代对象切成不超过batch_size的列表"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
 class MedicalGraph:
-    def __init__(self):
+    def __init__(self, batch_size=5000):
         cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
         self.data_path = os.path.join(cur_dir, 'data/medical.json')
-        self.g = Graph(
-            host="127.0.0.1",  # neo4j 搭载服务器的ip地址，ifconfig可获取到
-            http_port=7474,  # neo4j 服务器监听的端口号
-            user="lhy",  # 数据库user name，如果没有更改过，应该是neo4j
-            password="lhy123")
-
-    '''读取文件'''
-    def read_nodes(self):
-        # 共７类节点
-        drugs = [] # 药品
-        foods = [] #　食物
-        checks = [] # 检查
-        departments = [] #科室
-        producers = [] #药品大类
-        diseases = [] #疾病
-        symptoms = []#症状
-
-        disease_infos = []#疾病信息
-
-        # 构建节点实体关系
-        rels_department = [] #　科室－科室关系
-        rels_noteat = [] # 疾病－忌吃食物关系
-        rels_doeat = [] # 疾病－宜吃食物关系
-        rels_recommandeat = [] # 疾病－推荐吃食物关系
-        rels_commonddrug = [] # 疾病－通用药品关系
-        rels_recommanddrug = [] # 疾病－热门药品关系
-        rels_check = [] # 疾病－检查关系
-        rels_drug_producer = [] # 厂商－药物关系
-
-        rels_symptom = [] #疾病症状关系
-        rels_acompany = [] # 疾病并发关系
-        rels_category = [] #　疾病与科室之间的关系
-
-
-        count = 0
-        for data in open(self.data_path):
-            disease_dict = {}
-            count += 1
-            print(count)
-            data_json = json.loads(data)
-            disease = data_json['name']
-            disease_dict['name'] = disease
-            diseases.append(disease)
-            disease_dict['desc'] = ''
-            disease_dict['prevent'] = ''
-            disease_dict['cause'] = ''
-            disease_dict['easy_get'] = ''
-            disease_dict['cure_department'] = ''
-            disease_dict['cure_way'] = ''
-            disease_dict['cure_lasttime'] = ''
-            disease_dict['symptom'] = ''
-            disease_dict['cured_prob'] = ''
-
-            if 'symptom' in data_json:
-                symptoms += data_json['symptom']
-                for symptom in data_json['symptom']:
-                    rels_symptom.append([disease, symptom])
-
-            if 'acompany' in data_json:
-                for acompany in data_json['acompany']:
-                    rels_acompany.append([disease, acompany])
-
-            if 'desc' in data_json:
-                disease_dict['desc'] = data_json['desc']
-
-            if 'prevent' in data_json:
-                disease_dict['prevent'] = data_json['prevent']
-
-            if 'cause' in data_json:
-                disease_dict['cause'] = data_json['cause']
-
-            if 'get_prob' in data_json:
-                disease_dict['get_prob'] = data_json['get_prob']
-
-            if 'easy_get' in data_json:
-                disease_dict['easy_get'] = data_json['easy_get']
-
-            if 'cure_department' in data_json:
-                cure_department = data_json['cure_department']
-                if len(cure_department) == 1:
-                     rels_category.append([disease, cure_department[0]])
-                if len(cure_department) == 2:
-                    big = cure_department[0]
-                    small = cure_department[1]
-                    rels_department.append([small, big])
-                    rels_category.append([disease, small])
-
-                disease_dict['cure_department'] = cure_department
-                departments += cure_department
-
-            if 'cure_way' in data_json:
-                disease_dict['cure_way'] = data_json['cure_way']
-
-            if  'cure_lasttime' in data_json:
-                disease_dict['cure_lasttime'] = data_json['cure_lasttime']
-
-            if 'cured_prob' in data_json:
-                disease_dict['cured_prob'] = data_json['cured_prob']
-
-            if 'common_drug' in data_json:
-                common_drug = data_json['common_drug']
-                for drug in common_drug:
-                    rels_commonddrug.append([disease, drug])
-                drugs += common_drug
-
-            if 'recommand_drug' in data_json:
-                recommand_drug = data_json['recommand_drug']
-                drugs += recommand_drug
-                for drug in recommand_drug:
-                    rels_recommanddrug.append([disease, drug])
-
-            if 'not_eat' in data_json:
-                not_eat = data_json['not_eat']
-                for _not in not_eat:
-                    rels_noteat.append([disease, _not])
-
-                foods += not_eat
-                do_eat = data_json['do_eat']
-                for _do in do_eat:
-                    rels_doeat.append([disease, _do])
-
-                foods += do_eat
-                recommand_eat = data_json['recommand_eat']
-
-                for _recommand in recommand_eat:
-                    rels_recommandeat.append([disease, _recommand])
-                foods += recommand_eat
-
-            if 'check' in data_json:
-                check = data_json['check']
-                for _check in check:
-                    rels_check.append([disease, _check])
-                checks += check
-            if 'drug_detail' in data_json:
-                drug_detail = data_json['drug_detail']
-                producer = [i.split('(')[0] for i in drug_detail]
-                rels_drug_producer += [[i.split('(')[0], i.split('(')[-1].replace(')', '')] for i in drug_detail]
-                producers += producer
-            disease_infos.append(disease_dict)
-        return set(drugs), set(foods), set(checks), set(departments), set(producers), set(symptoms), set(diseases), disease_infos,\
-               rels_check, rels_recommandeat, rels_noteat, rels_doeat, rels_department, rels_commonddrug, rels_drug_producer, rels_recommanddrug,\
-               rels_symptom, rels_acompany, rels_category
-
-    '''建立节点'''
+        # 连接地址、账号与连接池配置见graph_client.GRAPH_SETTINGS，可用NEO4J_*环境变量修改
+        self.client = get_graph_client()
+        self.g = self.client.graph
+        # 批量导入时每个UNWIND事务包含的行数
+        self.batch_size = batch_size
+        # read_corpus()的结果
+        self.corpus = None
+
+    '''读取文件：单遍流式解析medical.json，结果在本对象内复用，建节点、建边与导出不再重复读取'''
+    def read_corpus(self):
+        if self.corpus is None:
+            meter = ProgressMeter('read medical.json')
+            self.corpus = read_medical(self.data_path, progress=meter.update)
+            meter.finish()
+        return self.corpus
+
+    '''建立节点：按batch_size分批，每批一条UNWIND/CREATE事务'''
     def create_node(self, label, nodes):
-        count = 0
-        for node_name in nodes:
-            node = Node(label, name=node_name)
-            self.g.create(node)
-            count += 1
-            print(count, len(nodes))
+        query = "UNWIND $names AS name CREATE (:%s {name: name})" % label
+        meter = ProgressMeter(label, len(nodes))
+        for batch in iter_batches(nodes, self.batch_size):
+            self.client.run(query, {'names': batch}, readonly=False)
+            meter.update(len(batch))
+        meter.finish()
         return
 
-    '''创建知识图谱中心疾病的节点'''
-    def create_diseases_nodes(self, disease_infos):
-        count = 0
-        for disease_dict in disease_infos:
-            node = Node("Disease", name=disease_dict['name'], desc=disease_dict['desc'],
-                        prevent=disease_dict['prevent'] ,cause=disease_dict['cause'],
-                        easy_get=disease_dict['easy_get'],cure_lasttime=disease_dict['cure_lasttime'],
-                        cure_department=disease_dict['cure_department']
-                        ,cure_way=disease_dict['cure_way'] , cured_prob=disease_dict['cured_prob'])
-            self.g.create(node)
-            count += 1
-            print(count)
+    '''创建知识图谱中心疾病的节点：属性整行写入，按batch_size分批'''
+    def create_diseases_nodes(self, disease_infos, total=None):
+        query = "UNWIND $rows AS row CREATE (n:Disease) SET n = row"
+        meter = ProgressMeter('Disease', total)
+        for batch in iter_batches(disease_infos, self.batch_size):
+            rows = [{key: disease_dict[key] for key in DISEASE_KEYS} for disease_dict in batch]
+            self.client.run(query, {'rows': rows}, readonly=False)
+            meter.update(len(batch))
+        meter.finish()
         return
 
     '''创建知识图谱实体节点类型schema'''
     def create_graphnodes(self):
-        Drugs, Foods, Checks, Departments, Producers, Symptoms, Diseases, disease_infos,rels_check, rels_recommandeat, rels_noteat, rels_doeat, rels_department, rels_commonddrug, rels_drug_producer, rels_recommanddrug,rels_symptom, rels_acompany, rels_category = self.read_nodes()
-        self.create_diseases_nodes(disease_infos)
-        self.create_node('Drug', Drugs)
-        print(len(Drugs))
-        self.create_node('Food', Foods)
-        print(len(Foods))
-        self.create_node('Check', Checks)
-        print(len(Checks))
-        self.create_node('Department', Departments)
-        print(len(Departments))
-        self.create_node('Producer', Producers)
-        print(len(Producers))
-        self.create_node('Symptom', Symptoms)
+        corpus = self.read_corpus()
+        self.create_diseases_nodes(corpus.iter_disease_infos(), total=len(corpus.disease_offsets))
+        for label in NODE_LABELS[1:]:
+            self.create_node(label, corpus.node_names(label))
+        # 图谱已变化，问答端的查询缓存随之失效
+        bump_graph_version()
         return
 
 
+    '''在各类节点的name上建立唯一约束(或索引)，使建边时按name匹配节点走索引'''
+    def create_name_indexes(self):
+        for label in NODE_LABELS:
+            errors = []
+            for statement in NAME_SCHEMA_STATEMENTS:
+                try:
+                    self.client.run(statement % label, readonly=False)
+                    break
+                except Exception as e:
+                    errors.append(e)
+            else:
+                print('failed to index :%s(name): %s' % (label, errors[-1]))
+        # 等待索引填充完成后再建边
+        try:
+            self.client.run("CALL db.awaitIndexes(300)", readonly=False)
+        except Exception as e:
+            print(e)
+
     '''创建实体关系边'''
     def create_graphrels(self):
-        Drugs, Foods, Checks, Departments, Producers, Symptoms, Diseases, disease_infos, rels_check, rels_recommandeat, rels_noteat, rels_doeat, rels_department, rels_commonddrug, rels_drug_producer, rels_recommanddrug,rels_symptom, rels_acompany, rels_category = self.read_nodes()
-        self.create_relationship('Disease', 'Food', rels_recommandeat, 'recommand_eat', '推荐食谱')
-        self.create_relationship('Disease', 'Food', rels_noteat, 'no_eat', '忌吃')
-        self.create_relationship('Disease', 'Food', rels_doeat, 'do_eat', '宜吃')
-        self.create_relationship('Department', 'Department', rels_department, 'belongs_to', '属于')
-        self.create_relationship('Disease', 'Drug', rels_commonddrug, 'common_drug', '常用药品')
-        self.create_relationship('Producer', 'Drug', rels_drug_producer, 'drugs_of', '生产药品')
-        self.create_relationship('Disease', 'Drug', rels_recommanddrug, 'recommand_drug', '好评药品')
-        self.create_relationship('Disease', 'Check', rels_check, 'need_check', '诊断检查')
-        self.create_relationship('Disease', 'Symptom', rels_symptom, 'has_symptom', '症状')
-        self.create_relationship('Disease', 'Disease', rels_acompany, 'acompany_with', '并发症')
-        self.create_relationship('Disease', 'Department', rels_category, 'belongs_to', '所属科室')
-
-    '''创建实体关联边'''
+        corpus = self.read_corpus()
+        self.create_name_indexes()
+        reports = []
+        for key, start_node, end_node, rel_type, rel_name in REL_SPECS:
+            reports.append(self.create_relationship(start_node, end_node, corpus.edges[key], rel_type, rel_name))
+        self.print_report(reports)
+        bump_graph_version()
+        return reports
+
+    '''创建实体关联边：edges为已去重的(起点, 终点)名称对，分批UNWIND写入，返回该类关系的统计'''
     def create_relationship(self, start_node, end_node, edges, rel_type, rel_name):
-        count = 0
-        # 去重处理
-        set_edges = []
-        for edge in edges:
-            set_edges.append('###'.join(edge))
-        all = len(set(set_edges))
-        for edge in set(set_edges):
-            edge = edge.split('###')
-            p = edge[0]
-            q = edge[1]
-            query = "match(p:%s),(q:%s) where p.name='%s'and q.name='%s' create (p)-[rel:%s{name:'%s'}]->(q)" % (
-                start_node, end_node, p, q, rel_type, rel_name)
+        query = "UNWIND $pairs AS pair MATCH (p:%s {name: pair[0]}), (q:%s {name: pair[1]}) " \
+                "CREATE (p)-[:%s {name: $rel_name}]->(q) RETURN count(*) AS created" % (start_node, end_node, rel_type)
+        report = {'rel': '%s-[%s]->%s' % (start_node, rel_type, end_node), 'edges': len(edges),
+                  'created': 0, 'failed': 0, 'batches': 0}
+        meter = ProgressMeter(report['rel'], len(edges))
+        for batch in iter_batches(edges, self.batch_size):
             try:
-                self.g.run(query)
-                count += 1
-                print(rel_type, count, all)
+                created = self.client.run(query, {'pairs': [list(pair) for pair in batch], 'rel_name': rel_name},
+                                          readonly=False).evaluate()
+                report['created'] += created or 0
             except Exception as e:
+                report['failed'] += len(batch)
                 print(e)
-        return
-
-    '''导出数据'''
+            report['batches'] += 1
+            meter.update(len(batch))
+        report['seconds'] = meter.finish()
+        return report
+
+    '''按关系类型打印建边耗时报告'''
+    def print_report(self, reports):
+        print('%-40s %9s %9s %7s %8s %9s %10s' % ('relationship', 'edges', 'created', 'failed', 'batches', 'seconds', 'edges/s'))
+        for report in reports:
+            seconds = report['seconds']
+            print('%-40s %9d %9d %7d %8d %9.2f %10.0f' % (report['rel'], report['edges'], report['created'], report['failed'],
+                                                        report['batches'], seconds, report['edges'] / seconds if seconds else 0))
+        print('total: %d edges in %.2fs' % (sum(i['edges'] for i in reports), sum(i['seconds'] for i in reports)))
+
+    '''导出数据：各类实体名写入当前目录下的词典文件，每行一个'''
     def export_data(self):
-        Drugs, Foods, Checks, Departments, Producers, Symptoms, Diseases, disease_infos, rels_check, rels_recommandeat, rels_noteat, rels_doeat, rels_department, rels_commonddrug, rels_drug_producer, rels_recommanddrug, rels_symptom, rels_acompany, rels_category = self.read_nodes()
-        f_drug = open('drug.txt', 'w+')
-        f_food = open('food.txt', 'w+')
-        f_check = open('check.txt', 'w+')
-        f_department = open('department.txt', 'w+')
-        f_producer = open('producer.txt', 'w+')
-        f_symptom = open('symptoms.txt', 'w+')
-        f_disease = open('disease.txt', 'w+')
-
-        f_drug.write('\n'.join(list(Drugs)))
-        f_food.write('\n'.join(list(Foods)))
-        f_check.write('\n'.join(list(Checks)))
-        f_department.write('\n'.join(list(Departments)))
-        f_producer.write('\n'.join(list(Producers)))
-        f_symptom.write('\n'.join(list(Symptoms)))
-        f_disease.write('\n'.join(list(Diseases)))
-
-        f_drug.close()
-        f_food.close()
-        f_check.close()
-        f_department.close()
-        f_producer.close()
-        f_symptom.close()
-        f_disease.close()
-
+        corpus = self.read_corpus()
+        files = [('Drug', 'drug.txt'), ('Food', 'food.txt'), ('Check', 'check.txt'), ('Department', 'department.txt'),
+                 ('Producer', 'producer.txt'), ('Symptom', 'symptoms.txt'), ('Disease', 'disease.txt')]
+        for label, path in files:
+            with open(path, 'w+') as f:
+                f.write('\n'.join(corpus.node_names(label)))
         return
 
 
 
 if __name__ == '__main__':
-    handler = MedicalGraph()
+    arg_parser = argparse.ArgumentParser(description='导入医疗知识图谱')
+    arg_parser.add_argument('--batch-size', type=int, default=5000, help='每个UNWIND事务写入的节点数')
+    arg_parser.add_argument('--export-csv', metavar='DIR', help='不连接数据库，导出neo4j-admin import所需的CSV到DIR')
+    arg_parser.add_argument('--sync', action='store_true', help='按data/graph.manifest.json增量同步，只写入有变化的节点与关系')
+    args = arg_parser.parse_args()
+    if args.sync:
+        from graph_sync import sync
+        summary, timings = sync(get_graph_client(), os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/medical.json'),
+                                batch_size=args.batch_size)
+        print(summary, timings)
+        sys.exit(0)
+    if args.export_csv:
+        from graph_export import check_export, export_csv, import_command
+        corpus = read_medical(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/medical.json'))
+        export_csv(corpus, args.export_csv)
+        problems = check_export(corpus, args.export_csv)
+        print('\n'.join(problems) or 'consistency check passed')
+        print(import_command(args.export_csv))
+        sys.exit(1 if problems else 0)
+    handler = MedicalGraph(batch_size=args.batch_size)
     print("step1:导入图谱节点中")
     handler.create_graphnodes()
     print("step2:导入图谱边中")      
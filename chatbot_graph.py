@@ -4,33 +4,97 @@
 # Author: lhy<lhy_in_blcu@126.com,https://huangyong.github.io>
 # Date: 18-10-4
 
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from question_classifier import *
 from question_parser import *
 from answer_search import *
+from answer_cache import AnswerCache
+from tracing import TRACER
 
 '''问答类'''
 class ChatBotGraph:
-    def __init__(self):
-        self.classifier = QuestionClassifier()
-        self.parser = QuestionPaser()
-        self.searcher = AnswerSearcher()
+    default_answer = '您好，我是小勇医药智能助理，希望可以帮到您。如果没答上来，可联系https://liuhuanyong.github.io/。祝您身体棒棒！'
+
+    def __init__(self, classifier=None, parser=None, searcher=None):
+        # 可传入已加载的分类器等组件，便于多个会话/工作进程共享
+        self.classifier = classifier or QuestionClassifier()
+        self.parser = parser or QuestionPaser()
+        self.searcher = searcher or AnswerSearcher(cache=AnswerCache())
 
     def chat_main(self, sent):
-        answer = '您好，我是小勇医药智能助理，希望可以帮到您。如果没答上来，可联系https://liuhuanyong.github.io/。祝您身体棒棒！'
-        res_classify = self.classifier.classify(sent)
+        if TRACER.enabled:
+            return self.chat_main_traced(sent)
+        return self.answer_classified(self.classifier.classify(sent))
+
+    '''chat_main的计时版本，开启追踪(tracing.configure / QA_TRACE)时使用'''
+    def chat_main_traced(self, sent):
+        with TRACER.trace():
+            with TRACER.stage('classify'):
+                res_classify = self.classifier.classify(sent)
+            return self.answer_classified(res_classify)
+
+    '''由分类结果生成回复，批量问答时分类可整批先做'''
+    def answer_classified(self, res_classify):
+        answer = self.default_answer
         if not res_classify:
+            TRACER.incr('unanswered', 'no_entity')
             return answer
-        res_sql = self.parser.parser_main(res_classify)
+        if TRACER.enabled:
+            with TRACER.stage('parse'):
+                res_sql = self.parser.parser_main(res_classify)
+        else:
+            res_sql = self.parser.parser_main(res_classify)
         final_answers = self.searcher.search_main(res_sql)
+        if not final_answers:
+            TRACER.incr('unanswered', 'no_result')
+            return answer
+        else:
+            return '\n'.join(final_answers)
+
+'''异步问答类：分类在事件循环内直接完成，各问题类型的图谱查询并发执行，整体有截止时间'''
+class AsyncChatBotGraph(ChatBotGraph):
+    def __init__(self, timeout=3.0, max_workers=32, **kwargs):
+        super().__init__(**kwargs)
+        # 单次问答的总时限(秒)，超时未返回的问题类型不再等待，只返回已完成的部分
+        self.timeout = timeout
+        # py2neo为同步客户端，图谱查询放到线程池中执行
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def chat_main(self, sent, timeout=None):
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        answer = self.default_answer
+        with TRACER.stage('classify'):
+            res_classify = self.classifier.classify(sent)
+        if not res_classify:
+            return answer
+        with TRACER.stage('parse'):
+            res_sql = self.parser.parser_main(res_classify)
+        if not res_sql:
+            return answer
+        loop = asyncio.get_running_loop()
+        tasks = [loop.run_in_executor(self.executor, self.searcher.search_one, sql_) for sql_ in res_sql]
+        done, pending = await asyncio.wait(tasks, timeout=max(deadline - time.monotonic(), 0))
+        for task in pending:
+            task.cancel()
+        # 按问题类型原有顺序拼接已完成的回复，查询出错的类型与超时一样跳过
+        final_answers = []
+        for task in tasks:
+            if task in done and not task.cancelled() and task.exception() is None and task.result():
+                final_answers.append(task.result())
         if not final_answers:
             return answer
         else:
             return '\n'.join(final_answers)
 
+    def close(self):
+        self.executor.shutdown(wait=False)
+
 if __name__ == '__main__':
     handler = ChatBotGraph()
     while 1:
         question = input('用户:')
         answer = handler.chat_main(question)
         print('小勇:', answer)
-
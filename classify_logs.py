@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: classify_logs.py
+# 离线问句日志分类：流式读取JSONL，按块分发到进程池做分类与解析，按输入顺序写出结果
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+
+from question_classifier import QuestionClassifier
+from question_parser import QuestionPaser
+
+# 工作进程内的分类器与解析器；fork方式启动时直接继承父进程已加载的词典，页面写时复制共享
+classifier = None
+parser = None
+
+
+def init_worker():
+    """工作进程初始化：未从父进程继承到分类器时(如spawn方式)从词典快照加载一次"""
+    global classifier, parser
+    if classifier is None:
+        classifier = QuestionClassifier()
+    if parser is None:
+        parser = QuestionPaser()
+
+
+def parse_line(line, field):
+    """取出一行日志中的问句，支持JSON对象、JSON字符串和纯文本；空行与缺少问句字段的JSON对象返回None"""
+    line = line.rstrip('\n')
+    if not line.strip():
+        return None
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return line
+    if isinstance(item, dict):
+        question = item.get(field)
+        return question if isinstance(question, str) else None
+    if isinstance(item, str):
+        return item
+    # 恰好能解析为JSON数字、true、null等的纯文本行，按原文作为问句
+    return line
+
+
+def process_chunk(chunk, field):
+    """处理一块日志，返回(进程号, 问句数, 耗时, 序列化后的结果行)；问句数不含空行与占位行"""
+    start = time.perf_counter()
+    questions = [parse_line(line, field) for line in chunk]
+    valid = [question for question in questions if question is not None]
+    results = iter(classifier.classify_batch(valid))
+    lines = []
+    for line, question in zip(chunk, questions):
+        if question is None:
+            # 无法取出问句的行(含空行)也写一行占位，保持输出与输入逐行对应
+            error = 'empty line' if not line.strip() else 'no question field'
+            lines.append(json.dumps({'question': None, 'error': error, 'raw': line.rstrip('\n')}, ensure_ascii=False))
+            continue
+        res_classify = next(results)
+        sqls = parser.parser_main(res_classify) if res_classify else []
+        lines.append(json.dumps({'question': question, 'classify': res_classify, 'sqls': sqls}, ensure_ascii=False))
+    return os.getpid(), len(valid), time.perf_counter() - start, '\n'.join(lines) + '\n'
+
+
+def read_chunks(f, chunk_size):
+    """按行数切块，惰性读取，不把整个文件读入内存；空行也保留，由process_chunk输出占位行"""
+    chunk = []
+    for line in f:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(input_path, output_path, workers, chunk_size, max_inflight, field):
+    global classifier, parser
+    # 父进程先加载(必要时重建)词典快照，fork出的工作进程共享这份内存
+    classifier = QuestionClassifier()
+    parser = QuestionPaser()
+    worker_stats = {}
+    total = 0
+    start = time.perf_counter()
+    with open(input_path, encoding='utf-8') as fin, open(output_path, 'w', encoding='utf-8') as fout, \
+            multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        # 在途块数有上限：窗口满时先等最早的块完成并写出，既保证输出有序也限制内存
+        pending = deque()
+
+        def drain_one():
+            pid, count, cost, text = pending.popleft().get()
+            fout.write(text)
+            stats = worker_stats.setdefault(pid, [0, 0.0])
+            stats[0] += count
+            stats[1] += cost
+            return count
+
+        for chunk in read_chunks(fin, chunk_size):
+            if len(pending) >= max_inflight:
+                total += drain_one()
+            pending.append(pool.apply_async(process_chunk, (chunk, field)))
+        while pending:
+            total += drain_one()
+    cost = time.perf_counter() - start
+
+    print('%-10s %12s %10s %12s' % ('worker', 'questions', 'busy(s)', 'q/s'), file=sys.stderr)
+    for pid, (count, busy) in sorted(worker_stats.items()):
+        print('%-10d %12d %10.2f %12.0f' % (pid, count, busy, count / busy if busy else 0), file=sys.stderr)
+    print('total: %d questions in %.2fs, %.0f q/s with %d workers' % (total, cost, total / cost if cost else 0, workers),
+          file=sys.stderr)
+    return total
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='分类并解析问句日志(JSONL)')
+    arg_parser.add_argument('input', help='输入JSONL，每行一个问句对象')
+    arg_parser.add_argument('output', help='输出JSONL，与输入逐行对应')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    arg_parser.add_argument('--chunk-size', type=int, default=5000, help='每个任务包含的行数')
+    arg_parser.add_argument('--max-inflight', type=int, default=None, help='同时在途的块数上限，默认为workers的2倍')
+    arg_parser.add_argument('--field', default='question', help='JSON对象中问句所在字段')
+    args = arg_parser.parse_args()
+    run(args.input, args.output, args.workers, args.chunk_size, args.max_inflight or args.workers * 2, args.field)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: entity_extractor.py
+# 多类型实体抽取：全部词典词建一个Aho-Corasick自动机，对问句线性扫描一遍得到全部命中，
+# 再按最长匹配消解重叠；装有pyahocorasick时用其C实现，否则退化为同接口的纯Python自动机
+
+from collections import deque
+
+try:
+    import pyahocorasick
+except ImportError:
+    # 独立部署版(medical_qa_system.py)不依赖第三方包
+    pyahocorasick = None
+
+
+class PyAutomaton:
+    """纯Python的Aho-Corasick自动机，接口与pyahocorasick.Automaton用到的部分一致：
+    add_word / make_automaton / iter，iter按结束位置递增输出(end_index, value)"""
+    def __init__(self):
+        # 状态i的转移表、失败指针、在该状态结束的词的value、沿失败链最近的有输出状态
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]
+        self.dict_link = [0]
+
+    def add_word(self, word, value):
+        state = 0
+        for char in word:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+                self.dict_link.append(0)
+            state = next_state
+        self.output[state] = value
+
+    def make_automaton(self):
+        """按宽度优先计算失败指针与输出链"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                fail_state = self.fail[next_state]
+                self.dict_link[next_state] = fail_state if self.output[fail_state] is not None else self.dict_link[fail_state]
+
+    def iter(self, text):
+        goto, fail, output, dict_link = self.goto, self.fail, self.output, self.dict_link
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            # 同一结束位置先输出最长的词，与pyahocorasick一致
+            match = state if output[state] is not None else dict_link[state]
+            while match:
+                yield index, output[match]
+                match = dict_link[match]
+
+
+def new_automaton():
+    return pyahocorasick.Automaton() if pyahocorasick is not None else PyAutomaton()
+
+
+def maximal_spans(hits):
+    """最长匹配消解：hits为自动机按结束位置递增输出的(end_index, (词, payload))，
+    返回不被其它命中覆盖的区间[(start, end, 词, payload)]，起止位置均递增；
+    spans作为栈保存当前的极大区间，新命中若与栈顶同结束位置且不更长则被覆盖，否则弹出被它覆盖的区间后入栈"""
+    spans = []
+    for end_index, (wd, payload) in hits:
+        end = end_index + 1
+        start = end - len(wd)
+        if spans:
+            top = spans[-1]
+            if top[1] == end and top[0] <= start:
+                continue
+            while spans and spans[-1][0] >= start:
+                spans.pop()
+        spans.append((start, end, wd, payload))
+    return spans
+
+
+class EntityExtractor:
+    """按类型的词表构建一个共享的自动机，一次扫描抽取全部类型的实体"""
+    def __init__(self, words_by_type):
+        self.types = list(words_by_type)
+        word_types = {}
+        for type_, words in words_by_type.items():
+            for word in words:
+                types = word_types.setdefault(word, [])
+                if type_ not in types:
+                    types.append(type_)
+        self.automaton = new_automaton()
+        for word, types in word_types.items():
+            self.automaton.add_word(word, (word, tuple(types)))
+        self.automaton.make_automaton()
+        self.size = len(word_types)
+
+    def spans(self, text):
+        return maximal_spans(self.automaton.iter(text))
+
+    def extract(self, text):
+        """{类型: [实体, ...]}，实体按在文本中出现的顺序排列、同类型内去重，未命中的类型不出现"""
+        entities = {}
+        for _, _, wd, types in self.spans(text):
+            for type_ in types:
+                words = entities.setdefault(type_, [])
+                if wd not in words:
+                    words.append(wd)
+        return entities
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: file_util.py
+# 数据文件的公共操作：源文件的版本戳，以及先写临时文件再原子替换的写入
+
+import os
+from contextlib import contextmanager
+
+
+def source_stamp(path):
+    """文件的(大小, 修改时间ns)，由它生成的索引、图谱文件记下该值，不一致时即视为过期"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """with atomic_write(path) as f: 写入同目录下的临时文件，正常结束后原子替换path，
+    并发启动的进程不会读到半个文件；写入出错时删除临时文件，原文件不变"""
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with open(tmp_path, mode, encoding=None if 'b' in mode else 'utf-8') as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: graph_client.py
+# 共享的Neo4j客户端：Bolt协议，连接池大小与连接寿命可配置，查询带超时与指数退避重试，可导出连接池统计
+
+import os
+import random
+import threading
+import time
+
+from py2neo import Graph
+from py2neo.errors import ConnectionBroken, ConnectionLimit, ConnectionUnavailable, Neo4jError
+
+# 默认连接配置，均可用环境变量覆盖
+GRAPH_SETTINGS = {
+    'uri': os.environ.get('NEO4J_URI', 'bolt://127.0.0.1:7687'),
+    'user': os.environ.get('NEO4J_USER', 'lhy'),
+    'password': os.environ.get('NEO4J_PASSWORD', 'lhy123'),
+    # 连接池上限，池满时查询按退避重试等待空闲连接
+    'max_size': int(os.environ.get('NEO4J_MAX_CONNECTIONS', 40)),
+    # 连接最长存活秒数，超过后归还时关闭
+    'max_age': float(os.environ.get('NEO4J_MAX_AGE', 3600)),
+    # 单次查询(含重试)的总时限
+    'timeout': float(os.environ.get('NEO4J_TIMEOUT', 5.0)),
+    'retries': int(os.environ.get('NEO4J_RETRIES', 3)),
+    'backoff': float(os.environ.get('NEO4J_BACKOFF', 0.05)),
+    'max_backoff': float(os.environ.get('NEO4J_MAX_BACKOFF', 1.0)),
+}
+
+# 可重试的连接层错误；Neo4jError另按should_retry()判断
+RETRY_ERRORS = (ConnectionUnavailable, ConnectionBroken, ConnectionLimit)
+
+
+class GraphTimeout(Exception):
+    """查询在时限内未能完成"""
+
+
+class GraphClient:
+    """线程安全的图谱客户端，同一进程内的查询复用同一个连接池"""
+    def __init__(self, uri=None, user=None, password=None, max_size=None, max_age=None,
+                 timeout=None, retries=None, backoff=None, max_backoff=None, graph=None):
+        settings = dict(GRAPH_SETTINGS)
+        settings.update({k: v for k, v in dict(uri=uri, user=user, password=password, max_size=max_size,
+                                                 max_age=max_age, timeout=timeout, retries=retries,
+                                                 backoff=backoff, max_backoff=max_backoff).items() if v is not None})
+        self.settings = settings
+        if graph is None:
+            graph = Graph(settings['uri'], auth=(settings['user'], settings['password']),
+                          max_size=settings['max_size'], max_age=settings['max_age'])
+        self.graph = graph
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.retried = 0
+        self.failures = 0
+        self.busy_time = 0.0
+
+    def backoff_delay(self, attempt):
+        """第attempt次重试前的等待时间：指数增长，带随机抖动"""
+        delay = min(self.settings['max_backoff'], self.settings['backoff'] * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def run(self, cypher, parameters=None, readonly=True, timeout=None, retry=None):
+        """执行一条查询并返回游标；只读查询默认在连接错误、池满和可重试的服务端错误时退避重试，
+        写查询默认不重试(非幂等)，timeout为含重试在内的总时限。
+        重试只覆盖发出查询，之后从游标取结果时连接断开不会重试，只读查询应使用data()"""
+        return self.call(lambda: self.graph.auto(readonly=readonly).run(cypher, parameters), readonly, timeout, retry)
+
+    def data(self, cypher, parameters=None, readonly=True, timeout=None, retry=None):
+        """执行查询并取回全部结果行，发出查询与取结果整体在重试与时限范围内"""
+        return self.call(lambda: self.graph.auto(readonly=readonly).run(cypher, parameters).data(),
+                         readonly, timeout, retry)
+
+    def call(self, func, readonly=True, timeout=None, retry=None):
+        """在重试与时限范围内执行func()，返回其结果；参数含义同run()"""
+        if retry is None:
+            retry = readonly
+        deadline = time.monotonic() + (self.settings['timeout'] if timeout is None else timeout)
+        attempt = 0
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return func()
+                except (RETRY_ERRORS + (Neo4jError,)) as e:
+                    if isinstance(e, Neo4jError) and not e.should_retry():
+                        raise
+                    if not retry or attempt >= self.settings['retries']:
+                        raise
+                    delay = self.backoff_delay(attempt)
+                    if time.monotonic() + delay >= deadline:
+                        raise GraphTimeout('query did not complete within the timeout after %d attempts' % (attempt + 1)) from e
+                    attempt += 1
+                    with self.lock:
+                        self.retried += 1
+                    time.sleep(delay)
+        except Exception:
+            with self.lock:
+                self.failures += 1
+            raise
+        finally:
+            with self.lock:
+                self.queries += 1
+                self.busy_time += time.perf_counter() - start
+
+    def pool_stats(self):
+        """各连接池的连接数与客户端计数"""
+        pools = []
+        connector = getattr(getattr(self.graph, 'service', None), 'connector', None)
+        for profile, pool in list(getattr(connector, '_pools', {}).items()):
+            pools.append({
+                'address': str(profile.address),
+                'size': pool.size,
+                'in_use': pool.in_use,
+                'max_size': pool.max_size,
+            })
+        with self.lock:
+            return {
+                'pools': pools,
+                'queries': self.queries,
+                'retries': self.retried,
+                'failures': self.failures,
+                'busy_time': self.busy_time,
+            }
+
+
+shared_client = None
+shared_lock = threading.Lock()
+
+
+def get_graph_client():
+    """返回本进程共享的GraphClient，首次调用时建立连接池"""
+    global shared_client
+    with shared_lock:
+        if shared_client is None:
+            shared_client = GraphClient()
+        return shared_client
+
+
+def reset_after_fork():
+    # 子进程不能沿用父进程的socket，丢弃引用(不关闭，避免影响父进程的连接)，用时重新建立
+    global shared_client, shared_lock
+    shared_client = None
+    shared_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
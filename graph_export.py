@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: graph_export.py
+# 离线导出：将medical.json转成neo4j-admin import使用的节点/关系CSV与表头文件，
+# 节点ID确定(按首次出现顺序编号)，导出后与MedicalCorpus逐项核对
+
+import argparse
+import csv
+import os
+import sys
+from collections import Counter
+
+from medical_reader import DISEASE_KEYS, NODE_LABELS, REL_SPECS, read_medical
+
+cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+
+# 写文件缓冲区大小
+BUFFER_SIZE = 1 << 20
+# 数组属性的分隔符，与neo4j-admin的默认--array-delimiter一致
+ARRAY_DELIMITER = ';'
+# Disease节点中的数组属性
+DISEASE_ARRAY_KEYS = ('cure_department', 'cure_way')
+
+
+def node_file(label):
+    return 'nodes_%s.csv' % label
+
+
+def rel_file(key):
+    return 'rels_%s.csv' % key
+
+
+def header_file(name):
+    return name.replace('.csv', '_header.csv')
+
+
+def node_header(label):
+    if label != 'Disease':
+        return [':ID(%s)' % label, 'name']
+    return [':ID(Disease)'] + [key + ':string[]' if key in DISEASE_ARRAY_KEYS else key for key in DISEASE_KEYS]
+
+
+def rel_header(start_label, end_label):
+    return [':START_ID(%s)' % start_label, ':END_ID(%s)' % end_label, 'name', ':TYPE']
+
+
+def array_value(value):
+    """数组属性写成分隔符连接的字符串，空串或空列表导出为空值"""
+    if isinstance(value, list):
+        return ARRAY_DELIMITER.join(value)
+    return value or ''
+
+
+def open_csv(path):
+    return open(path, 'w', encoding='utf-8', newline='', buffering=BUFFER_SIZE)
+
+
+def write_header(out_dir, name, header):
+    with open_csv(os.path.join(out_dir, header_file(name))) as f:
+        csv.writer(f).writerow(header)
+
+
+def node_index(corpus):
+    """各标签内名称id到节点ID的映射；Disease按记录编号，同名疾病有多个节点"""
+    index = {}
+    for label in NODE_LABELS[1:]:
+        index[label] = {name_id: [node_id] for node_id, name_id in enumerate(corpus.nodes[label])}
+    disease_index = {}
+    for node_id, name_id in enumerate(corpus.disease_ids):
+        disease_index.setdefault(name_id, []).append(node_id)
+    index['Disease'] = disease_index
+    return index
+
+
+def iter_rel_ids(corpus, index, key, start_label, end_label):
+    """按在线建边的MATCH语义展开关系：端点名对应的全部节点两两相连，端点不存在的边丢弃"""
+    start_index = index[start_label]
+    end_index = index[end_label]
+    ids = corpus.edges[key].ids
+    for i in range(0, len(ids), 2):
+        starts = start_index.get(ids[i])
+        ends = end_index.get(ids[i + 1])
+        if starts and ends:
+            for start in starts:
+                for end in ends:
+                    yield start, end
+
+
+def export_csv(corpus, out_dir):
+    """写出全部节点与关系文件，返回{文件名: 行数}"""
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    index = node_index(corpus)
+
+    name = node_file('Disease')
+    write_header(out_dir, name, node_header('Disease'))
+    with open_csv(os.path.join(out_dir, name)) as f:
+        writer = csv.writer(f)
+        count = 0
+        for node_id, info in enumerate(corpus.iter_disease_infos()):
+            writer.writerow([node_id] + [array_value(info[key]) if key in DISEASE_ARRAY_KEYS else info[key]
+                                         for key in DISEASE_KEYS])
+            count += 1
+        counts[name] = count
+
+    names = corpus.names
+    for label in NODE_LABELS[1:]:
+        name = node_file(label)
+        write_header(out_dir, name, node_header(label))
+        with open_csv(os.path.join(out_dir, name)) as f:
+            csv.writer(f).writerows((node_id, names[name_id]) for node_id, name_id in enumerate(corpus.nodes[label]))
+        counts[name] = len(corpus.nodes[label])
+
+    for key, start_label, end_label, rel_type, rel_name in REL_SPECS:
+        name = rel_file(key)
+        write_header(out_dir, name, rel_header(start_label, end_label))
+        count = 0
+        with open_csv(os.path.join(out_dir, name)) as f:
+            writer = csv.writer(f)
+            for start, end in iter_rel_ids(corpus, index, key, start_label, end_label):
+                writer.writerow((start, end, rel_name, rel_type))
+                count += 1
+        counts[name] = count
+    return counts
+
+
+def import_command(out_dir, database='neo4j'):
+    """对应的neo4j-admin import命令(Neo4j 4.x写法，5.x为neo4j-admin database import full)"""
+    args = ['neo4j-admin import', '--database=%s' % database, '--multiline-fields=true',
+            '--array-delimiter="%s"' % ARRAY_DELIMITER]
+    for label in NODE_LABELS:
+        name = node_file(label)
+        args.append('--nodes=%s=%s,%s' % (label, os.path.join(out_dir, header_file(name)), os.path.join(out_dir, name)))
+    for key, _, _, _, _ in REL_SPECS:
+        name = rel_file(key)
+        args.append('--relationships=%s,%s' % (os.path.join(out_dir, header_file(name)), os.path.join(out_dir, name)))
+    return ' \\\n    '.join(args)
+
+
+def read_rows(out_dir, name):
+    with open(os.path.join(out_dir, header_file(name)), encoding='utf-8', newline='') as f:
+        header = next(csv.reader(f))
+    with open(os.path.join(out_dir, name), encoding='utf-8', newline='') as f:
+        return header, list(csv.reader(f))
+
+
+def check_export(corpus, out_dir):
+    """读回CSV，与在线建库按MedicalCorpus写入的节点、属性与关系比对，返回发现的问题列表"""
+    problems = []
+    node_names = {}
+    for label in NODE_LABELS:
+        name = node_file(label)
+        header, rows = read_rows(out_dir, name)
+        if header != node_header(label):
+            problems.append('%s: unexpected header %r' % (name, header))
+        ids = [row[0] for row in rows]
+        if len(set(ids)) != len(ids):
+            problems.append('%s: duplicate node ids' % name)
+        node_names[label] = {row[0]: row[1] for row in rows}
+        if label == 'Disease':
+            expected = list(corpus.iter_disease_infos())
+            if len(rows) != len(expected):
+                problems.append('%s: %d rows, expected %d' % (name, len(rows), len(expected)))
+            for row, info in zip(rows, expected):
+                for key, value in zip(DISEASE_KEYS, row[1:]):
+                    if key in DISEASE_ARRAY_KEYS:
+                        expected_value = info[key] if isinstance(info[key], list) else ([info[key]] if info[key] else [])
+                        if (value.split(ARRAY_DELIMITER) if value else []) != expected_value:
+                            problems.append('%s: %s of %s differs' % (name, key, info['name']))
+                    elif value != info[key]:
+                        problems.append('%s: %s of %s differs' % (name, key, info['name']))
+        elif Counter(node_names[label].values()) != Counter(corpus.node_names(label)):
+            problems.append('%s: node names differ from reader' % name)
+
+    label_names = {label: set(corpus.node_names(label)) for label in NODE_LABELS}
+    disease_counts = Counter(corpus.names[name_id] for name_id in corpus.disease_ids)
+    for key, start_label, end_label, rel_type, rel_name in REL_SPECS:
+        name = rel_file(key)
+        header, rows = read_rows(out_dir, name)
+        if header != rel_header(start_label, end_label):
+            problems.append('%s: unexpected header %r' % (name, header))
+        exported = Counter()
+        for start, end, row_name, row_type in rows:
+            if row_name != rel_name or row_type != rel_type:
+                problems.append('%s: unexpected name/type %s/%s' % (name, row_name, row_type))
+                break
+            start_name = node_names[start_label].get(start)
+            end_name = node_names[end_label].get(end)
+            if start_name is None or end_name is None:
+                problems.append('%s: dangling id %s->%s' % (name, start, end))
+                break
+            exported[(start_name, end_name)] += 1
+        # 在线建边时每个名称对会连到同名的全部节点
+        expected = Counter()
+        for start_name, end_name in corpus.edges[key]:
+            if start_name in label_names[start_label] and end_name in label_names[end_label]:
+                multiplicity = 1
+                if start_label == 'Disease':
+                    multiplicity *= disease_counts[start_name]
+                if end_label == 'Disease':
+                    multiplicity *= disease_counts[end_name]
+                expected[(start_name, end_name)] = multiplicity
+        if exported != expected:
+            problems.append('%s: %d relationships, expected %d' % (name, sum(exported.values()), sum(expected.values())))
+    return problems
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='导出neo4j-admin import所需的CSV文件')
+    arg_parser.add_argument('--data', default=os.path.join(cur_dir, 'data/medical.json'))
+    arg_parser.add_argument('--out', default=os.path.join(cur_dir, 'data/import'))
+    arg_parser.add_argument('--database', default='neo4j')
+    arg_parser.add_argument('--no-check', action='store_true', help='跳过导出后的一致性检查')
+    args = arg_parser.parse_args()
+
+    corpus = read_medical(args.data)
+    counts = export_csv(corpus, args.out)
+    for name, count in counts.items():
+        print('%-28s %9d' % (name, count))
+    if not args.no_check:
+        problems = check_export(corpus, args.out)
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        if problems:
+            sys.exit(1)
+        print('consistency check passed')
+    print(import_command(args.out, args.database))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: graph_file.py
+# 编译后的二进制图谱文件：字符串池、定长节点记录、各标签的名称哈希表、正反向CSR邻接数组，
+# 读取端以mmap打开，数组直接映射为memoryview，多个进程经操作系统页缓存共享同一份数据
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from file_util import atomic_write, source_stamp
+from medical_reader import DISEASE_KEYS, NODE_LABELS, REL_SPECS
+from memory_graph import GraphQueries, MemoryGraph, PROP_INDEX
+
+cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+GRAPH_FILE_PATH = os.path.join(cur_dir, 'data/medical.graph')
+
+GRAPH_MAGIC = b'MQAG'
+GRAPH_VERSION = 1
+# 文件头：魔数、版本、目录(JSON)长度；目录记录各数据段的偏移、长度与类型
+GRAPH_HEADER = struct.Struct('<4sHxxI')
+ALIGN = 8
+
+# Disease节点的定长记录：名称与各文本属性的字符串id，数组属性为(起始, 个数)指向列表池
+DISEASE_LIST_KEYS = ('cure_department', 'cure_way')
+DISEASE_TEXT_KEYS = tuple(key for key in DISEASE_KEYS if key != 'name' and key not in DISEASE_LIST_KEYS)
+DISEASE_RECORD_WIDTH = 1 + len(DISEASE_TEXT_KEYS) + 2 * len(DISEASE_LIST_KEYS)
+
+# 以疾病为起点的关系在记录视图中对应medical.json的字段
+RECORD_FIELDS = {'symptom': 'symptom', 'acompany': 'acompany', 'common_drug': 'common_drug',
+                 'recommand_drug': 'recommand_drug', 'no_eat': 'not_eat', 'do_eat': 'do_eat',
+                 'recommand_eat': 'recommand_eat', 'check': 'check'}
+REL_END_LABELS = {spec[0]: spec[2] for spec in REL_SPECS}
+
+
+def name_hash(data):
+    return zlib.crc32(data)
+
+
+class StringPool:
+    """写入端的字符串池，相同字符串只存一份"""
+    def __init__(self):
+        self.ids = {}
+        self.offsets = array('Q', [0])
+        self.chunks = []
+        self.size = 0
+
+    def add(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            data = text.encode('utf-8')
+            string_id = self.ids[text] = len(self.offsets) - 1
+            self.chunks.append(data)
+            self.size += len(data)
+            self.offsets.append(self.size)
+        return string_id
+
+    def data(self):
+        return b''.join(self.chunks)
+
+
+def build_hash_table(names):
+    """开放寻址哈希表，槽位存节点id+1，0为空槽"""
+    size = 1
+    while size < 2 * len(names) + 1:
+        size <<= 1
+    table = array('I', bytes(4 * size))
+    mask = size - 1
+    for node_id, name in enumerate(names):
+        slot = name_hash(name.encode('utf-8')) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = node_id + 1
+    return table
+
+
+def text_value(value):
+    return value if isinstance(value, str) else ''
+
+
+def list_value(value):
+    if isinstance(value, list):
+        return value
+    return [value] if value else []
+
+
+def write_graph_file(graph, path=GRAPH_FILE_PATH, source=None):
+    """把MemoryGraph写成二进制图谱文件；先写临时文件再替换，读者不会看到半个文件"""
+    pool = StringPool()
+    sections = {}
+    for label in NODE_LABELS:
+        names = graph.node_names[label]
+        sections['names.%s' % label] = array('I', (pool.add(name) for name in names))
+        sections['hash.%s' % label] = build_hash_table(names)
+    records = array('I')
+    lists = array('I')
+    for node_id, props in enumerate(graph.disease_props):
+        records.append(sections['names.Disease'][node_id])
+        for key in DISEASE_TEXT_KEYS:
+            records.append(pool.add(text_value(props[PROP_INDEX[key]])))
+        for key in DISEASE_LIST_KEYS:
+            items = list_value(props[PROP_INDEX[key]])
+            records.append(len(lists))
+            records.append(len(items))
+            lists.extend(pool.add(item) for item in items)
+    sections['disease.records'] = records
+    sections['disease.lists'] = lists
+    for key, _, _, _, _ in REL_SPECS:
+        for direction, csrs in (('forward', graph.forward), ('backward', graph.backward)):
+            sections['%s.%s.offsets' % (direction, key)] = csrs[key].offsets
+            sections['%s.%s.targets' % (direction, key)] = csrs[key].targets
+    sections['strings.offsets'] = pool.offsets
+    sections['strings.data'] = pool.data()
+
+    # 先排好各段的位置，目录长度固定后再写数据
+    directory = {'source': source, 'counts': {label: len(graph.node_names[label]) for label in NODE_LABELS},
+                 'sections': {}}
+    blobs = []
+    for name, value in sections.items():
+        blob = value.tobytes() if isinstance(value, array) else value
+        typecode = value.typecode if isinstance(value, array) else 'B'
+        blobs.append((name, typecode, blob))
+    # 目录中的偏移相对数据区起点(文件头与目录之后按8字节对齐)
+    offset = 0
+    for name, typecode, blob in blobs:
+        directory['sections'][name] = [offset, len(blob), typecode]
+        offset += len(blob) + (-len(blob)) % ALIGN
+    directory_bytes = json.dumps(directory).encode('utf-8')
+    base = GRAPH_HEADER.size + len(directory_bytes)
+    base += (-base) % ALIGN
+
+    with atomic_write(path, 'wb') as f:
+        f.write(GRAPH_HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION, len(directory_bytes)))
+        f.write(directory_bytes)
+        f.write(b'\0' * (base - GRAPH_HEADER.size - len(directory_bytes)))
+        for name, typecode, blob in blobs:
+            f.write(blob)
+            f.write(b'\0' * ((-len(blob)) % ALIGN))
+    return path
+
+
+class GraphFile(GraphQueries):
+    """mmap打开的二进制图谱文件：可作为AnswerSearcher的graph，records属性提供按疾病名取记录的映射视图"""
+    def __init__(self, path=GRAPH_FILE_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # 导出的memoryview须在关闭mmap前全部释放
+        self.views = [memoryview(self.mm)]
+        self.sections = {}
+        try:
+            self.map_sections()
+        except ValueError:
+            self.close()
+            raise
+        self.strings = self.sections['strings.data']
+        self.string_offsets = self.sections['strings.offsets']
+        self.disease_records = self.sections['disease.records']
+        self.disease_lists = self.sections['disease.lists']
+        self.records = DiseaseRecords(self)
+        self.compile_plans()
+
+    def map_sections(self):
+        """校验文件头与目录后把各数据段映射为memoryview；文件被截断或格式不符时抛出ValueError"""
+        size = len(self.mm)
+        if size < GRAPH_HEADER.size:
+            raise ValueError('%s is truncated' % self.path)
+        magic, version, directory_size = GRAPH_HEADER.unpack_from(self.mm, 0)
+        if magic != GRAPH_MAGIC or version != GRAPH_VERSION:
+            raise ValueError('%s is not a version %d graph file' % (self.path, GRAPH_VERSION))
+        base = GRAPH_HEADER.size + directory_size
+        if base > size:
+            raise ValueError('%s is truncated' % self.path)
+        self.directory = json.loads(bytes(self.mm[GRAPH_HEADER.size:base]))
+        base += (-base) % ALIGN
+        for name, (offset, length, typecode) in self.directory['sections'].items():
+            if base + offset + length > size or length % struct.calcsize(typecode):
+                raise ValueError('%s is truncated: section %s' % (self.path, name))
+            section = self.views[0][base + offset:base + offset + length]
+            self.views.append(section)
+            if typecode != 'B':
+                section = section.cast(typecode)
+                self.views.append(section)
+            self.sections[name] = section
+
+    def close(self):
+        self.sections = self.strings = self.string_offsets = self.disease_records = self.disease_lists = None
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        self.mm.close()
+
+    def string(self, string_id):
+        return str(self.strings[self.string_offsets[string_id]:self.string_offsets[string_id + 1]], 'utf-8')
+
+    def node_count(self, label):
+        return self.directory['counts'][label]
+
+    def node_name(self, label, node_id):
+        return self.string(self.sections['names.%s' % label][node_id])
+
+    def node_id(self, label, name):
+        table = self.sections['hash.%s' % label]
+        names = self.sections['names.%s' % label]
+        data = name.encode('utf-8')
+        mask = len(table) - 1
+        slot = name_hash(data) & mask
+        while True:
+            entry = table[slot]
+            if not entry:
+                return None
+            string_id = names[entry - 1]
+            if self.strings[self.string_offsets[string_id]:self.string_offsets[string_id + 1]] == data:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def neighbors(self, key, node_id, reverse=False):
+        direction = 'backward' if reverse else 'forward'
+        offsets = self.sections['%s.%s.offsets' % (direction, key)]
+        return self.sections['%s.%s.targets' % (direction, key)][offsets[node_id]:offsets[node_id + 1]]
+
+    def disease_prop(self, node_id, prop):
+        record = self.disease_records[node_id * DISEASE_RECORD_WIDTH:(node_id + 1) * DISEASE_RECORD_WIDTH]
+        if prop == 'name':
+            return self.string(record[0])
+        if prop in DISEASE_TEXT_KEYS:
+            return self.string(record[1 + DISEASE_TEXT_KEYS.index(prop)])
+        index = 1 + len(DISEASE_TEXT_KEYS) + 2 * DISEASE_LIST_KEYS.index(prop)
+        start, count = record[index], record[index + 1]
+        return [self.string(i) for i in self.disease_lists[start:start + count]]
+
+    def disease_record(self, node_id):
+        """还原一条疾病记录：属性字段加上以该疾病为起点的关系列表"""
+        record = {key: self.disease_prop(node_id, key) for key in DISEASE_KEYS}
+        for key, field in RECORD_FIELDS.items():
+            end_label = REL_END_LABELS[key]
+            items = [self.node_name(end_label, i) for i in self.neighbors(key, node_id)]
+            if items:
+                record[field] = items
+        return record
+
+
+class DiseaseRecords:
+    """按疾病名取记录的只读映射，记录在访问时才从mmap中解码"""
+    def __init__(self, graph_file):
+        self.graph_file = graph_file
+
+    def __contains__(self, name):
+        return self.graph_file.node_id('Disease', name) is not None
+
+    def __getitem__(self, name):
+        node_id = self.graph_file.node_id('Disease', name)
+        if node_id is None:
+            raise KeyError(name)
+        return self.graph_file.disease_record(node_id)
+
+    def get(self, name, default=None):
+        node_id = self.graph_file.node_id('Disease', name)
+        return default if node_id is None else self.graph_file.disease_record(node_id)
+
+    def __len__(self):
+        return self.graph_file.node_count('Disease')
+
+    def __iter__(self):
+        for node_id in range(len(self)):
+            yield self.graph_file.node_name('Disease', node_id)
+
+    def keys(self):
+        return iter(self)
+
+
+def compile_graph_file(data_path, path=GRAPH_FILE_PATH):
+    return write_graph_file(MemoryGraph.from_json(data_path), path, source=source_stamp(data_path))
+
+
+def open_medical_records(data_path, path=GRAPH_FILE_PATH):
+    """图谱文件存在且与medical.json一致时返回其疾病记录映射，否则返回None由调用方回退到读取JSON"""
+    try:
+        graph_file = GraphFile(path)
+    except (OSError, ValueError):
+        return None
+    try:
+        # 目录经JSON往返后版本戳为列表
+        stale = tuple(graph_file.directory.get('source') or ()) != source_stamp(data_path)
+    except OSError:
+        stale = False
+    if stale:
+        print('%s is older than %s, run python graph_file.py to rebuild it' % (path, data_path), file=sys.stderr)
+        graph_file.close()
+        return None
+    return graph_file.records
+
+
+if __name__ == '__main__':
+    import argparse
+    arg_parser = argparse.ArgumentParser(description='由medical.json编译二进制图谱文件')
+    arg_parser.add_argument('--data', default=os.path.join(cur_dir, 'data/medical.json'))
+    arg_parser.add_argument('--out', default=GRAPH_FILE_PATH)
+    args = arg_parser.parse_args()
+    print(compile_graph_file(args.data, args.out))
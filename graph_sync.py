@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: graph_sync.py
+# 增量同步：为每条疾病记录计算指纹并与上次同步的清单比较，
+# 只对新增、修改、删除的记录所涉及的节点与关系执行批量MERGE/DELETE
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+
+from answer_cache import bump_graph_version
+from file_util import atomic_write
+from medical_reader import DISEASE_KEYS, REL_SPECS, disease_info, record_items
+
+cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+MANIFEST_PATH = os.path.join(cur_dir, 'data/graph.manifest.json')
+MANIFEST_VERSION = 1
+
+REL_INDEX = {spec[0]: spec for spec in REL_SPECS}
+
+
+def record_fingerprint(data_json):
+    return hashlib.sha1(json.dumps(data_json, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def scan_records(data_path):
+    """读取medical.json，按疾病名汇总：{名称: {'fp', 'nodes', 'edges', 'props'}}；
+    同名记录合并为一个Disease节点，属性取最后一条"""
+    records = {}
+    with open(data_path, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data_json = json.loads(line)
+            nodes, edges = record_items(data_json)
+            fp = record_fingerprint(data_json)
+            entry = records.get(data_json['name'])
+            if entry is None:
+                records[data_json['name']] = {'fp': fp, 'nodes': nodes, 'edges': edges, 'props': disease_info(data_json)}
+            else:
+                entry['fp'] = hashlib.sha1((entry['fp'] + fp).encode('ascii')).hexdigest()
+                entry['nodes'] = entry['nodes'] + nodes
+                entry['edges'] = entry['edges'] + edges
+                entry['props'] = disease_info(data_json)
+    for entry in records.values():
+        entry['nodes'] = list(dict.fromkeys(entry['nodes']))
+        entry['edges'] = list(dict.fromkeys(entry['edges']))
+    return records
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """读取上次同步的清单，不存在或版本不符时视为空图"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return {name: {'fp': entry['fp'], 'nodes': [tuple(i) for i in entry['nodes']],
+                   'edges': [tuple(i) for i in entry['edges']]}
+            for name, entry in manifest['records'].items()}
+
+
+def save_manifest(records, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {'version': MANIFEST_VERSION,
+            'records': {name: {'fp': entry['fp'], 'nodes': entry['nodes'], 'edges': entry['edges']}
+                        for name, entry in records.items()}}
+    with atomic_write(path) as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+class SyncPlan:
+    """一次增量同步要执行的变更"""
+    def __init__(self):
+        self.added = []
+        self.changed = []
+        self.removed = []
+        self.create_nodes = []
+        self.delete_nodes = []
+        self.update_diseases = []
+        self.create_edges = []
+        self.delete_edges = []
+
+    def empty(self):
+        return not (self.create_nodes or self.delete_nodes or self.update_diseases or self.create_edges or self.delete_edges)
+
+    def summary(self):
+        return {key: len(getattr(self, key)) for key in ('added', 'changed', 'removed', 'create_nodes', 'delete_nodes',
+                                                         'update_diseases', 'create_edges', 'delete_edges')}
+
+
+def plan_sync(old, new):
+    """比较新旧记录，得出需要写入图谱的最小变更集合；关系只在两端节点都存在时才落到图谱中(与在线建边的MATCH一致)"""
+    plan = SyncPlan()
+    for name, entry in new.items():
+        if name not in old:
+            plan.added.append(name)
+        elif old[name]['fp'] != entry['fp']:
+            plan.changed.append(name)
+    plan.removed = [name for name in old if name not in new]
+    dirty = plan.added + plan.changed + plan.removed
+    if not dirty:
+        return plan
+
+    # 节点与关系的引用计数，跨记录共享的节点(如药品)和关系(如厂商-药品)只有在全部引用消失后才删除
+    old_nodes, new_nodes = Counter(), Counter()
+    old_edges, new_edges = Counter(), Counter()
+    for records, nodes, edges in ((old, old_nodes, old_edges), (new, new_nodes, new_edges)):
+        for entry in records.values():
+            nodes.update(entry['nodes'])
+            edges.update(entry['edges'])
+
+    candidate_nodes = set()
+    candidate_edges = set()
+    for name in dirty:
+        for records in (old, new):
+            if name in records:
+                candidate_nodes.update(records[name]['nodes'])
+                candidate_edges.update(records[name]['edges'])
+    plan.create_nodes = sorted(node for node in candidate_nodes if new_nodes[node] and not old_nodes[node])
+    plan.delete_nodes = sorted(node for node in candidate_nodes if old_nodes[node] and not new_nodes[node])
+    plan.update_diseases = [new[name]['props'] for name in plan.added + plan.changed]
+
+    # 新出现或消失的节点会让未变化记录中指向它的关系生效或失效
+    flipped = {name for _, name in plan.create_nodes + plan.delete_nodes}
+    if flipped:
+        for edges in (old_edges, new_edges):
+            candidate_edges.update(edge for edge in edges if edge[1] in flipped or edge[2] in flipped)
+
+    def live(edge, nodes, edges):
+        _, start_label, end_label, _, _ = REL_INDEX[edge[0]]
+        return edges[edge] > 0 and nodes[(start_label, edge[1])] > 0 and nodes[(end_label, edge[2])] > 0
+
+    for edge in sorted(candidate_edges):
+        was_live = live(edge, old_nodes, old_edges)
+        is_live = live(edge, new_nodes, new_edges)
+        if is_live and not was_live:
+            plan.create_edges.append(edge)
+        elif was_live and not is_live:
+            plan.delete_edges.append(edge)
+    return plan
+
+
+def group_by(items, key_index):
+    groups = {}
+    for item in items:
+        groups.setdefault(item[key_index], []).append(item)
+    return groups
+
+
+class GraphSync:
+    """将SyncPlan分批写入图谱"""
+    def __init__(self, client, batch_size=5000):
+        from build_medicalgraph import iter_batches
+        self.client = client
+        self.batch_size = batch_size
+        self.iter_batches = iter_batches
+
+    def run_batches(self, query, key, rows, **params):
+        for batch in self.iter_batches(rows, self.batch_size):
+            self.client.run(query, dict(params, **{key: batch}), readonly=False)
+
+    def apply(self, plan):
+        timings = {}
+        start = time.perf_counter()
+        for rel_key, edges in group_by(plan.delete_edges, 0).items():
+            _, start_label, end_label, rel_type, rel_name = REL_INDEX[rel_key]
+            query = "UNWIND $pairs AS pair MATCH (p:%s {name: pair[0]})-[r:%s {name: $rel_name}]->(q:%s {name: pair[1]}) " \
+                    "DELETE r" % (start_label, rel_type, end_label)
+            self.run_batches(query, 'pairs', [[edge[1], edge[2]] for edge in edges], rel_name=rel_name)
+        timings['delete_edges'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for label, nodes in group_by(plan.delete_nodes, 0).items():
+            query = "UNWIND $names AS name MATCH (n:%s {name: name}) DETACH DELETE n" % label
+            self.run_batches(query, 'names', [node[1] for node in nodes])
+        timings['delete_nodes'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for label, nodes in group_by(plan.create_nodes, 0).items():
+            if label == 'Disease':
+                continue
+            query = "UNWIND $names AS name MERGE (:%s {name: name})" % label
+            self.run_batches(query, 'names', [node[1] for node in nodes])
+        # 新增与修改的疾病整行覆盖属性
+        query = "UNWIND $rows AS row MERGE (n:Disease {name: row.name}) SET n = row"
+        self.run_batches(query, 'rows', [{key: props[key] for key in DISEASE_KEYS} for props in plan.update_diseases])
+        timings['merge_nodes'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for rel_key, edges in group_by(plan.create_edges, 0).items():
+            _, start_label, end_label, rel_type, rel_name = REL_INDEX[rel_key]
+            query = "UNWIND $pairs AS pair MATCH (p:%s {name: pair[0]}), (q:%s {name: pair[1]}) " \
+                    "MERGE (p)-[:%s {name: $rel_name}]->(q)" % (start_label, end_label, rel_type)
+            self.run_batches(query, 'pairs', [[edge[1], edge[2]] for edge in edges], rel_name=rel_name)
+        timings['merge_edges'] = time.perf_counter() - start
+        return timings
+
+
+def sync(client, data_path, manifest_path=MANIFEST_PATH, batch_size=5000, dry_run=False):
+    """执行一次增量同步，返回(计划摘要, 各阶段耗时)；成功后才更新清单"""
+    new = scan_records(data_path)
+    old = load_manifest(manifest_path)
+    plan = plan_sync(old, new)
+    timings = {}
+    if not dry_run:
+        if not plan.empty():
+            timings = GraphSync(client, batch_size).apply(plan)
+            bump_graph_version()
+        if plan.added or plan.changed or plan.removed or not os.path.exists(manifest_path):
+            save_manifest(new, manifest_path)
+    return plan.summary(), timings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='按medical.json的变化增量更新图谱')
+    arg_parser.add_argument('--data', default=os.path.join(cur_dir, 'data/medical.json'))
+    arg_parser.add_argument('--manifest', default=MANIFEST_PATH)
+    arg_parser.add_argument('--batch-size', type=int, default=5000)
+    arg_parser.add_argument('--dry-run', action='store_true', help='只打印变更，不写图谱和清单')
+    args = arg_parser.parse_args()
+    client = None
+    if not args.dry_run:
+        from graph_client import get_graph_client
+        client = get_graph_client()
+    summary, timings = sync(client, args.data, args.manifest, args.batch_size, args.dry_run)
+    for key, value in summary.items():
+        print('%-16s %9d' % (key, value))
+    for key, value in timings.items():
+        print('%-16s %8.2fs' % (key, value))
+
+
+if __name__ == '__main__':
+    main()
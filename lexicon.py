@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: lexicon.py
+# 领域词典：带类型位掩码的词表索引，以及按词典文件哈希判断新鲜度的版本化快照
+
+import hashlib
+import os
+import pickle
+import struct
+
+import pyahocorasick
+
+from file_util import atomic_write
+
+# 实体类型及其位，顺序即check_medical返回的类型顺序
+ENTITY_TYPES = ['disease', 'department', 'check', 'drug', 'food', 'symptom', 'producer']
+TYPE_BITS = {type_: 1 << i for i, type_ in enumerate(ENTITY_TYPES)}
+# 位掩码 -> 类型列表的解码表，掩码空间只有2^7，一次性展开
+MASK_TYPES = [[type_ for type_ in ENTITY_TYPES if mask & TYPE_BITS[type_]] for mask in range(1 << len(ENTITY_TYPES))]
+
+# 快照文件头：魔数、格式版本、保留位、词典文件指纹(sha1)
+SNAPSHOT_MAGIC = b'MQAL'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct('<4sHH20s')
+
+
+class TypedLexicon:
+    """词 -> 类型位掩码索引，每个词典文件只顺序读取一遍"""
+    def __init__(self, word_masks=None):
+        self.word_masks = word_masks if word_masks is not None else {}
+
+    def add_file(self, path, type_):
+        """流式读入一个词典文件，将其中每个词打上type_对应的位"""
+        bit = TYPE_BITS[type_]
+        word_masks = self.word_masks
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                wd = line.strip()
+                if wd:
+                    word_masks[wd] = word_masks.get(wd, 0) | bit
+        return
+
+    def types_of(self, word):
+        """查询词的类型列表，未收录的词返回None"""
+        mask = self.word_masks.get(word)
+        if mask is None:
+            return None
+        return MASK_TYPES[mask]
+
+    def build_actree(self):
+        """构造actree，payload直接携带(词, 类型位掩码)"""
+        return build_automaton((wd, (wd, mask)) for wd, mask in self.word_masks.items())
+
+    def __len__(self):
+        return len(self.word_masks)
+
+    def __contains__(self, word):
+        return word in self.word_masks
+
+
+class IntentMatcher:
+    """将多组疑问词编译进同一个actree，payload为疑问词类别位掩码，一遍扫描得到全部类别"""
+    def __init__(self, cue_lists):
+        # cue_lists: [(类别名, 疑问词列表)]，按顺序分配类别位
+        self.category_bits = {}
+        cue_masks = {}
+        for i, (category, words) in enumerate(cue_lists):
+            bit = 1 << i
+            self.category_bits[category] = bit
+            for wd in words:
+                cue_masks[wd] = cue_masks.get(wd, 0) | bit
+        self.actree = build_automaton(cue_masks.items())
+
+    def mask_of(self, *categories):
+        """若干类别合并后的位掩码"""
+        mask = 0
+        for category in categories:
+            mask |= self.category_bits[category]
+        return mask
+
+    def match(self, sent):
+        """返回句中出现的全部疑问词类别位掩码"""
+        mask = 0
+        for _, cue_mask in self.actree.iter(sent):
+            mask |= cue_mask
+        return mask
+
+
+def build_automaton(items):
+    """由(词, payload)序列构造Aho-Corasick自动机"""
+    actree = pyahocorasick.Automaton()
+    for word, payload in items:
+        actree.add_word(word, payload)
+    actree.make_automaton()
+    return actree
+
+
+def dict_fingerprint(paths):
+    """计算一组词典文件的指纹，任一文件内容或文件名变化都会改变指纹"""
+    sha = hashlib.sha1()
+    for path in paths:
+        sha.update(os.path.basename(path).encode('utf-8'))
+        sha.update(b'\0')
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                sha.update(block)
+        sha.update(b'\0')
+    return sha.digest()
+
+
+def save_snapshot(path, fingerprint, payload):
+    """写入快照，先写临时文件再原子替换，避免并发启动的进程读到半个文件"""
+    with atomic_write(path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, fingerprint))
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_snapshot(path, fingerprint):
+    """读取快照并反序列化；actree与词表都在pickle中，整份读入本进程内存，不与其他进程共享页面。
+    文件不存在、版本不符或指纹过期时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < SNAPSHOT_HEADER.size:
+        return None
+    magic, version, _, snap_fingerprint = SNAPSHOT_HEADER.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or snap_fingerprint != fingerprint:
+        return None
+    try:
+        return pickle.loads(memoryview(data)[SNAPSHOT_HEADER.size:])
+    except Exception as e:
+        print('快照 %s 读取失败，将重新构建: %s' % (path, e))
+        return None
+
+
+if __name__ == '__main__':
+    # 构建步骤：强制重建并写出快照
+    from question_classifier import QuestionClassifier
+    handler = QuestionClassifier(rebuild_snapshot=True)
+    print('snapshot written to %s' % handler.snapshot_path)
@@ -2,10 +2,13 @@
 # coding: utf-8
 # 医疗知识图谱问答系统 - 最终版本
 
-import json
 import os
 import re
 
+from entity_extractor import EntityExtractor
+from graph_file import open_medical_records
+from record_store import LazyRecordStore
+
 class MedicalQuestionClassifier:
     """医疗问题分类器"""
     def __init__(self):
@@ -15,6 +18,14 @@ class MedicalQuestionClassifier:
         self.drug_words = self.load_dict('dict/drug.txt')
         self.food_words = self.load_dict('dict/food.txt')
         self.check_words = self.load_dict('dict/check.txt')
+        # 全部类型共用一个自动机，问句只扫描一遍
+        self.extractor = EntityExtractor({
+            'disease': self.disease_words,
+            'symptom': self.symptom_words,
+            'drug': self.drug_words,
+            'food': self.food_words,
+            'check': self.check_words,
+        })
         
         # 疑问词
         self.symptom_qwds = ['症状', '表征', '现象', '症候', '表现', '有哪些']
@@ -71,24 +82,8 @@ class MedicalQuestionClassifier:
         return data
     
     def check_medical(self, question):
-        """检查问题中的医疗实体"""
-        medical_dict = {}
-        
-        # 检查疾病
-        for disease in self.disease_words:
-            if disease in question:
-                if 'disease' not in medical_dict:
-                    medical_dict['disease'] = []
-                medical_dict['disease'].append(disease)
-        
-        # 检查症状
-        for symptom in self.symptom_words:
-            if symptom in question:
-                if 'symptom' not in medical_dict:
-                    medical_dict['symptom'] = []
-                medical_dict['symptom'].append(symptom)
-        
-        return medical_dict
+        """检查问题中的医疗实体：{类型: [实体, ...]}，重叠的命中只保留最长的词"""
+        return self.extractor.extract(question)
     
     def check_words_in_question(self, words, question):
         """检查问题中是否包含特定词汇"""
@@ -103,18 +98,17 @@ class MedicalAnswerSearcher:
         self.medical_data = self.load_medical_data()
     
     def load_medical_data(self):
-        """加载医疗数据"""
+        """加载医疗数据：优先mmap打开编译好的data/medical.graph(python graph_file.py生成)，
+        不存在或已过期时按偏移索引从medical.json中按需读取记录"""
         data_path = os.path.join(os.path.dirname(__file__), 'data/medical.json')
-        medical_data = {}
+        medical_data = open_medical_records(data_path)
+        if medical_data is not None:
+            return medical_data
         try:
-            with open(data_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        disease_data = json.loads(line)
-                        medical_data[disease_data['name']] = disease_data
+            return LazyRecordStore(data_path)
         except Exception as e:
             print(f"加载医疗数据失败: {e}")
-        return medical_data
+        return {}
     
     def search_main(self, question_type, disease_name):
         """搜索答案"""
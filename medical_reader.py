@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: medical_reader.py
+# medical.json单遍流式读取：实体名统一驻留为整数id，节点表与关系边存放在array中，
+# 疾病的长文本属性不常驻内存，按行偏移量回读
+
+import json
+from array import array
+
+# 节点标签与medical.json中对应的字段
+NODE_LABELS = ['Disease', 'Drug', 'Food', 'Check', 'Department', 'Producer', 'Symptom']
+
+# 关系：(关系键, 起点标签, 终点标签, 关系类型, 关系名称)，顺序即建边顺序
+REL_SPECS = [
+    ('recommand_eat', 'Disease', 'Food', 'recommand_eat', '推荐食谱'),
+    ('no_eat', 'Disease', 'Food', 'no_eat', '忌吃'),
+    ('do_eat', 'Disease', 'Food', 'do_eat', '宜吃'),
+    ('department', 'Department', 'Department', 'belongs_to', '属于'),
+    ('common_drug', 'Disease', 'Drug', 'common_drug', '常用药品'),
+    ('drug_producer', 'Producer', 'Drug', 'drugs_of', '生产药品'),
+    ('recommand_drug', 'Disease', 'Drug', 'recommand_drug', '好评药品'),
+    ('check', 'Disease', 'Check', 'need_check', '诊断检查'),
+    ('symptom', 'Disease', 'Symptom', 'has_symptom', '症状'),
+    ('acompany', 'Disease', 'Disease', 'acompany_with', '并发症'),
+    ('category', 'Disease', 'Department', 'belongs_to', '所属科室'),
+]
+
+# Disease节点写入图谱的属性
+DISEASE_KEYS = ['name', 'desc', 'prevent', 'cause', 'easy_get', 'cure_lasttime', 'cure_department', 'cure_way', 'cured_prob']
+
+
+def disease_info(data_json):
+    """从一条记录取出Disease节点的属性，缺失的字段为空串"""
+    return {key: data_json.get(key, '') for key in DISEASE_KEYS}
+
+
+def record_items(data_json):
+    """一条记录产生的节点[(标签, 名称)]与关系[(关系键, 起点名, 终点名)]，规则与原read_nodes一致；
+    第一个节点是疾病本身，并发症与药品明细中的药品只作为关系终点，不单独建节点"""
+    disease = data_json['name']
+    nodes = [('Disease', disease)]
+    edges = []
+    for symptom in data_json.get('symptom', []):
+        nodes.append(('Symptom', symptom))
+        edges.append(('symptom', disease, symptom))
+    for acompany in data_json.get('acompany', []):
+        edges.append(('acompany', disease, acompany))
+    if 'cure_department' in data_json:
+        cure_department = data_json['cure_department']
+        nodes.extend(('Department', department) for department in cure_department)
+        if len(cure_department) == 1:
+            edges.append(('category', disease, cure_department[0]))
+        if len(cure_department) == 2:
+            big, small = cure_department
+            edges.append(('department', small, big))
+            edges.append(('category', disease, small))
+    for key in ('common_drug', 'recommand_drug'):
+        for drug in data_json.get(key, []):
+            nodes.append(('Drug', drug))
+            edges.append((key, disease, drug))
+    if 'not_eat' in data_json:
+        for key, rel_key in (('not_eat', 'no_eat'), ('do_eat', 'do_eat'), ('recommand_eat', 'recommand_eat')):
+            for food in data_json.get(key, []):
+                nodes.append(('Food', food))
+                edges.append((rel_key, disease, food))
+    for check in data_json.get('check', []):
+        nodes.append(('Check', check))
+        edges.append(('check', disease, check))
+    for detail in data_json.get('drug_detail', []):
+        producer = detail.split('(')[0]
+        nodes.append(('Producer', producer))
+        edges.append(('drug_producer', producer, detail.split('(')[-1].replace(')', '')))
+    return nodes, edges
+
+
+class EdgeList:
+    """某类关系的边，以起点id、终点id交替存放在一个array中，迭代时还原为名称对"""
+    def __init__(self, corpus, key):
+        self.corpus = corpus
+        self.key = key
+        self.ids = array('I')
+        self.seen = set()
+
+    def add(self, start_id, end_id):
+        pair = (start_id << 32) | end_id
+        if pair not in self.seen:
+            self.seen.add(pair)
+            self.ids.append(start_id)
+            self.ids.append(end_id)
+
+    def __len__(self):
+        return len(self.ids) // 2
+
+    def __iter__(self):
+        names = self.corpus.names
+        ids = self.ids
+        for i in range(0, len(ids), 2):
+            yield names[ids[i]], names[ids[i + 1]]
+
+
+class MedicalCorpus:
+    """medical.json读取一遍后的紧凑表示，供建节点、建边与导出词典共用"""
+    def __init__(self, data_path):
+        self.data_path = data_path
+        # 名称驻留表：id -> 名称，名称 -> id
+        self.names = []
+        self.name_ids = {}
+        # 每类节点按首次出现顺序保存去重后的名称id
+        self.nodes = {label: array('I') for label in NODE_LABELS}
+        self.node_seen = {label: set() for label in NODE_LABELS}
+        self.edges = {spec[0]: EdgeList(self, spec[0]) for spec in REL_SPECS}
+        # 每条疾病记录的名称id，以及在文件中的字节偏移与长度
+        self.disease_ids = array('I')
+        self.disease_offsets = array('Q')
+        self.disease_lengths = array('I')
+
+    def intern(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def add_node(self, label, name):
+        name_id = self.intern(name)
+        if name_id not in self.node_seen[label]:
+            self.node_seen[label].add(name_id)
+            self.nodes[label].append(name_id)
+        return name_id
+
+    def add_record(self, data_json):
+        """登记一条疾病记录中的节点与关系"""
+        nodes, edges = record_items(data_json)
+        self.disease_ids.append(self.add_node('Disease', nodes[0][1]))
+        for label, name in nodes[1:]:
+            self.add_node(label, name)
+        intern = self.intern
+        for key, start, end in edges:
+            self.edges[key].add(intern(start), intern(end))
+
+    def finish(self):
+        # 去重用的集合只在读取期间需要
+        self.node_seen = None
+        for edge_list in self.edges.values():
+            edge_list.seen = None
+
+    def node_names(self, label):
+        names = self.names
+        return [names[i] for i in self.nodes[label]]
+
+    def node_count(self, label):
+        return len(self.nodes[label])
+
+    def iter_disease_infos(self):
+        """按文件顺序逐条回读疾病记录，只在需要时解析长文本属性"""
+        with open(self.data_path, 'rb') as f:
+            for offset, length in zip(self.disease_offsets, self.disease_lengths):
+                f.seek(offset)
+                yield disease_info(json.loads(f.read(length)))
+
+
+def read_medical(data_path, progress=None):
+    """流式读取medical.json一遍，返回MedicalCorpus；progress为可选的进度回调，每读一条记录调用一次"""
+    corpus = MedicalCorpus(data_path)
+    offset = 0
+    with open(data_path, 'rb') as f:
+        for line in f:
+            length = len(line)
+            if line.strip():
+                corpus.add_record(json.loads(line))
+                corpus.disease_offsets.append(offset)
+                corpus.disease_lengths.append(length)
+                if progress is not None:
+                    progress()
+            offset += length
+    corpus.finish()
+    return corpus
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: memory_graph.py
+# 进程内只读图谱：由medical.json构建，节点为各标签内的整数id，名称经哈希索引映射到id，
+# 每类关系正反两个方向各一份CSR邻接数组；实现QuestionPaser全部查询模板，可直接作为AnswerSearcher的graph
+
+import os
+import re
+from array import array
+
+from medical_reader import DISEASE_KEYS, NODE_LABELS, REL_SPECS, read_medical
+from question_parser import BATCH_TEMPLATES, CYPHER_TEMPLATES, QUESTION_TEMPLATES
+
+cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+
+# 关系键 -> (起点标签, 终点标签) / 关系名称；Disease属性 -> 序号
+REL_LABELS = {spec[0]: (spec[1], spec[2]) for spec in REL_SPECS}
+REL_NAMES = {spec[0]: spec[4] for spec in REL_SPECS}
+PROP_INDEX = {key: i for i, key in enumerate(DISEASE_KEYS)}
+
+PROPERTY_PATTERN = re.compile(r'^MATCH \(m:(\w+)\) where m\.name = \$name return m\.name, m\.(\w+)$')
+RELATION_PATTERN = re.compile(r'^MATCH \(m:(\w+)\)-\[r:(\w+)\]->\(n:(\w+)\) where ([mn])\.name = \$name return m\.name, r\.name, n\.name$')
+
+
+def compile_template(cypher):
+    """把单实体查询模板解析成查找计划：('property', 标签, 属性) 或 ('relation', 关系键, 是否按终点查)"""
+    match = PROPERTY_PATTERN.match(cypher)
+    if match:
+        return 'property', match.group(1), match.group(2)
+    match = RELATION_PATTERN.match(cypher)
+    if match:
+        start_label, rel_type, end_label, side = match.groups()
+        for key, start, end, spec_type, _ in REL_SPECS:
+            if (start, end, spec_type) == (start_label, end_label, rel_type):
+                return 'relation', key, side == 'n'
+    raise ValueError('unsupported query template: %s' % cypher)
+
+
+class MemoryCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return self.rows
+
+    def evaluate(self):
+        return next(iter(self.rows[0].values())) if self.rows else None
+
+
+class CSR:
+    """压缩稀疏行邻接：offsets[i]到offsets[i+1]之间是节点i的邻居id"""
+    def __init__(self, node_count, pairs):
+        counts = [0] * (node_count + 1)
+        for source, _ in pairs:
+            counts[source + 1] += 1
+        for i in range(node_count):
+            counts[i + 1] += counts[i]
+        self.offsets = array('I', counts)
+        targets = array('I', bytes(4 * len(pairs)))
+        cursor = list(counts[:-1])
+        for source, target in pairs:
+            targets[cursor[source]] = target
+            cursor[source] += 1
+        self.targets = targets
+
+    def neighbors(self, node_id):
+        return self.targets[self.offsets[node_id]:self.offsets[node_id + 1]]
+
+
+class GraphQueries:
+    """把QuestionPaser的查询模板翻译为按名称查节点、沿关系取邻居的查找；子类提供节点与邻接的存取"""
+    def compile_plans(self):
+        # 查询文本 -> 查找计划
+        self.plans = {}
+        for template_id, cypher in CYPHER_TEMPLATES.items():
+            self.plans[cypher] = ('single', compile_template(cypher))
+        for question_type, cypher in BATCH_TEMPLATES.items():
+            parts = [compile_template(CYPHER_TEMPLATES[template_id]) for template_id in QUESTION_TEMPLATES[question_type]]
+            self.plans[cypher] = ('batch', parts)
+
+    def lookup(self, plan, name):
+        """按单实体查询计划返回结果行"""
+        if plan[0] == 'property':
+            _, label, prop = plan
+            node_id = self.node_id(label, name)
+            if node_id is None:
+                return []
+            return [{'m.name': name, 'm.%s' % prop: self.disease_prop(node_id, prop)}]
+        _, key, reverse = plan
+        start_label, end_label = REL_LABELS[key]
+        rel_name = REL_NAMES[key]
+        if reverse:
+            node_id = self.node_id(end_label, name)
+            if node_id is None:
+                return []
+            return [{'m.name': self.node_name(start_label, i), 'r.name': rel_name, 'n.name': name}
+                    for i in self.neighbors(key, node_id, reverse=True)]
+        node_id = self.node_id(start_label, name)
+        if node_id is None:
+            return []
+        return [{'m.name': name, 'r.name': rel_name, 'n.name': self.node_name(end_label, i)}
+                for i in self.neighbors(key, node_id)]
+
+    def run(self, cypher, parameters=None, **kwargs):
+        plan = self.plans.get(cypher)
+        if plan is None:
+            raise ValueError('%s only supports the QuestionPaser templates' % type(self).__name__)
+        kind, value = plan
+        if kind == 'single':
+            return MemoryCursor(self.lookup(value, parameters['name']))
+        # 批量模板：与UNWIND查询相同的列与(part, i)顺序
+        rows = []
+        multi = len(value) > 1
+        for part, part_plan in enumerate(value):
+            for i, name in enumerate(parameters['names']):
+                for row in self.lookup(part_plan, name):
+                    row['i'] = i
+                    row['name'] = name
+                    if multi:
+                        row['part'] = part
+                    rows.append(row)
+        return MemoryCursor(rows)
+
+    def data(self, cypher, parameters=None, **kwargs):
+        return self.run(cypher, parameters).data()
+
+
+class MemoryGraph(GraphQueries):
+    """只读的内存图谱，接口与AnswerSearcher使用的GraphClient一致：run(cypher, parameters).data()与data(cypher, parameters)"""
+    def __init__(self, corpus):
+        # 各标签的节点名称表与名称->id索引
+        self.node_names = {label: corpus.node_names(label) for label in NODE_LABELS}
+        self.node_ids = {label: {name: i for i, name in enumerate(names)} for label, names in self.node_names.items()}
+        # Disease属性，同名记录合并为一个节点，属性取最后一条
+        disease_ids = self.node_ids['Disease']
+        self.disease_props = [None] * len(disease_ids)
+        for info in corpus.iter_disease_infos():
+            self.disease_props[disease_ids[info['name']]] = tuple(info[key] for key in DISEASE_KEYS)
+        # 每类关系的正向与反向CSR，端点不存在的边与在线建边的MATCH一样被丢弃
+        self.forward = {}
+        self.backward = {}
+        for key, start_label, end_label, _, _ in REL_SPECS:
+            start_ids = self.node_ids[start_label]
+            end_ids = self.node_ids[end_label]
+            pairs = [(start_ids[start], end_ids[end]) for start, end in corpus.edges[key]
+                     if start in start_ids and end in end_ids]
+            self.forward[key] = CSR(len(start_ids), pairs)
+            self.backward[key] = CSR(len(end_ids), [(end, start) for start, end in pairs])
+        self.compile_plans()
+
+    @classmethod
+    def from_json(cls, data_path=os.path.join(cur_dir, 'data/medical.json')):
+        return cls(read_medical(data_path))
+
+    def node_id(self, label, name):
+        return self.node_ids[label].get(name)
+
+    def node_name(self, label, node_id):
+        return self.node_names[label][node_id]
+
+    def neighbors(self, key, node_id, reverse=False):
+        return (self.backward if reverse else self.forward)[key].neighbors(node_id)
+
+    def disease_prop(self, node_id, prop):
+        return self.disease_props[node_id][PROP_INDEX[prop]]
+
+    def stats(self):
+        return {
+            'nodes': {label: len(names) for label, names in self.node_names.items()},
+            'relationships': {key: len(csr.targets) for key, csr in self.forward.items()},
+        }
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: metrics.py
+# 延迟直方图，可跨线程记录，输出Prometheus文本格式
+
+import threading
+from bisect import bisect_left
+
+# 默认分桶上界(秒)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labels):
+    """将标签字典格式化为Prometheus的{k="v",...}形式"""
+    if not labels:
+        return ''
+    items = ['%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in sorted(labels.items())]
+    return '{%s}' % ','.join(items)
+
+
+class LatencyHistogram:
+    """固定分桶的延迟直方图"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个桶对应+Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += seconds
+            self.count += 1
+
+    def quantile(self, q):
+        """按分桶估算分位数，返回所在桶的上界"""
+        with self.lock:
+            counts = list(self.counts)
+            count = self.count
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'buckets': list(self.buckets),
+                'counts': list(self.counts),
+                'sum': self.total,
+                'count': self.count,
+            }
+
+    def render_prometheus(self, name, labels=None):
+        """输出Prometheus直方图文本，桶计数为累计值"""
+        labels = dict(labels or {})
+        snap = self.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, n in zip(snap['buckets'] + ['+Inf'], snap['counts']):
+            cumulative += n
+            lines.append('%s_bucket%s %d' % (name, format_labels(dict(labels, le=bound)), cumulative))
+        lines.append('%s_sum%s %.6f' % (name, format_labels(labels), snap['sum']))
+        lines.append('%s_count%s %d' % (name, format_labels(labels), snap['count']))
+        return '\n'.join(lines)
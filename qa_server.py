@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: qa_server.py
+# 问答HTTP服务：父进程加载词典后预先fork多个工作进程，共享同一个监听端口，工作进程内以线程池处理请求
+
+import argparse
+import gc
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from answer_cache import AnswerCache
+from answer_search import AnswerSearcher
+from chatbot_graph import ChatBotGraph
+from memory_graph import MemoryGraph
+from metrics import LatencyHistogram
+from question_classifier import QuestionClassifier
+from question_parser import QuestionPaser
+from tracing import TRACER, configure as configure_tracing
+
+# 请求体大小与批量问句数上限
+MAX_BODY_BYTES = 1 << 20
+MAX_BATCH_SIZE = 1000
+# 连接空闲(或读请求)超过该秒数即关闭，避免keep-alive连接一直占住线程池中的线程
+IDLE_TIMEOUT = 5
+
+
+class QAService:
+    """一个工作进程内的问答服务，所有请求线程共享同一个ChatBotGraph"""
+    def __init__(self, bot):
+        self.bot = bot
+        self.histograms = {'/ask': LatencyHistogram(), '/ask_batch': LatencyHistogram()}
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record_error(self):
+        # 多个请求线程同时累加，需加锁
+        with self.lock:
+            self.errors += 1
+
+    def ask(self, question):
+        return self.bot.chat_main(question)
+
+    def ask_batch(self, questions):
+        # 整批先分类，再逐句查询
+        with TRACER.trace('batch'):
+            with TRACER.stage('classify_batch'):
+                classified = self.bot.classifier.classify_batch(questions)
+            return [self.bot.answer_classified(res) for res in classified]
+
+    def render_metrics(self):
+        labels = {'pid': os.getpid()}
+        lines = ['# TYPE qa_request_latency_seconds histogram']
+        for path, histogram in sorted(self.histograms.items()):
+            lines.append(histogram.render_prometheus('qa_request_latency_seconds', dict(labels, path=path)))
+        lines.append('# TYPE qa_request_errors_total counter')
+        lines.append('qa_request_errors_total{pid="%d"} %d' % (os.getpid(), self.errors))
+        cache = getattr(self.bot.searcher, 'cache', None)
+        if cache is not None:
+            for key, value in sorted(cache.stats().items()):
+                lines.append('qa_answer_cache_%s{pid="%d"} %s' % (key, os.getpid(), value))
+        pool_stats = getattr(self.bot.searcher.g, 'pool_stats', None)
+        if pool_stats is not None:
+            stats = pool_stats()
+            for pool in stats.pop('pools'):
+                for key in ('size', 'in_use', 'max_size'):
+                    lines.append('qa_graph_pool_%s{pid="%d",address="%s"} %s' % (key, os.getpid(), pool['address'], pool[key]))
+            for key, value in sorted(stats.items()):
+                lines.append('qa_graph_%s{pid="%d"} %s' % (key, os.getpid(), value))
+        # 开启追踪(--trace)时附带各阶段的延迟直方图与计数
+        trace_text = TRACER.render_prometheus(labels)
+        if trace_text:
+            lines.append(trace_text)
+        return '\n'.join(lines) + '\n'
+
+
+class QARequestHandler(BaseHTTPRequestHandler):
+    server_version = 'MedicalQA/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # 读超时时handle_one_request会关闭连接，释放所占的线程
+        self.timeout = self.server.idle_timeout
+        super().setup()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        # 请求体未读完就应答时，剩余字节会被当作下一个请求解析，这些情况下应答后关闭连接
+        value = (self.headers.get('Content-Length') or '0').strip()
+        if 'Transfer-Encoding' in self.headers or not (value.isascii() and value.isdigit()):
+            self.close_connection = True
+            raise ValueError('invalid Content-Length')
+        length = int(value)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise ValueError('request body too large')
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/metrics':
+            body = service.render_metrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/trace':
+            self.send_json(200, TRACER.snapshot())
+        elif self.path == '/health':
+            self.send_json(200, {'status': 'ok', 'pid': os.getpid()})
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path not in service.histograms:
+            # 不读请求体，应答后关闭连接
+            self.close_connection = True
+            self.send_json(404, {'error': 'not found'})
+            return
+        start = time.perf_counter()
+        try:
+            data = self.read_json()
+            if self.path == '/ask':
+                question = data.get('question') if isinstance(data, dict) else None
+                if not isinstance(question, str):
+                    raise ValueError('"question" must be a string')
+                result = {'answer': service.ask(question)}
+            else:
+                questions = data.get('questions') if isinstance(data, dict) else None
+                if not isinstance(questions, list) or not all(isinstance(i, str) for i in questions):
+                    raise ValueError('"questions" must be a list of strings')
+                if len(questions) > MAX_BATCH_SIZE:
+                    raise ValueError('at most %d questions per batch' % MAX_BATCH_SIZE)
+                result = {'answers': service.ask_batch(questions)}
+        except ValueError as e:
+            service.record_error()
+            self.send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            service.record_error()
+            self.send_json(500, {'error': str(e)})
+            return
+        finally:
+            service.histograms[self.path].observe(time.perf_counter() - start)
+        self.send_json(200, result)
+
+
+class PooledHTTPServer(HTTPServer):
+    """用固定大小线程池处理连接的HTTPServer；线程池在fork之后于各工作进程内创建"""
+    daemon_threads = True
+    service = None
+    pool = None
+    verbose = False
+    idle_timeout = IDLE_TIMEOUT
+
+    def start(self, service, threads):
+        self.service = service
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def build_service(classifier, parser, batch, graph=None):
+    """在工作进程内创建图谱连接与问答服务，连接不能跨fork共享；graph为内存图谱时各进程共享父进程加载的同一份"""
+    searcher = AnswerSearcher(graph=graph, batch=batch, cache=AnswerCache())
+    return QAService(ChatBotGraph(classifier=classifier, parser=parser, searcher=searcher))
+
+
+def worker_exit(signum, frame):
+    sys.exit(0)
+
+
+def serve(host, port, workers, threads, batch=True, verbose=False, memory_graph=None, idle_timeout=IDLE_TIMEOUT):
+    # 父进程先加载词典与actree(以及可选的内存图谱)，fork后工作进程以写时复制方式共享这部分内存
+    classifier = QuestionClassifier()
+    parser = QuestionPaser()
+    graph = MemoryGraph.from_json(memory_graph) if memory_graph else None
+    server = PooledHTTPServer((host, port), QARequestHandler)
+    server.verbose = verbose
+    server.idle_timeout = idle_timeout
+    print('serving on http://%s:%d with %d worker(s) x %d thread(s)' % (host, port, max(workers, 1), threads))
+
+    if workers <= 1:
+        server.start(build_service(classifier, parser, batch, graph), threads)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    # 将已加载的对象移出GC跟踪，避免子进程GC扫描时写这些页面导致复制
+    gc.freeze()
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            # 开启追踪时SIGTERM以SystemExit退出，先写出本进程的追踪汇总
+            signal.signal(signal.SIGTERM, worker_exit if TRACER.enabled else signal.SIG_DFL)
+            code = 0
+            try:
+                server.start(build_service(classifier, parser, batch, graph), threads)
+                server.serve_forever()
+            except Exception as e:
+                print('worker %d exited: %s' % (os.getpid(), e), file=sys.stderr)
+                code = 1
+            finally:
+                if TRACER.enabled:
+                    TRACER.flush()
+                os._exit(code)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+    server.server_close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='医疗问答HTTP服务')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8000)
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='预先fork的工作进程数')
+    arg_parser.add_argument('--threads', type=int, default=16, help='每个工作进程的请求线程数')
+    arg_parser.add_argument('--no-batch', action='store_true', help='关闭UNWIND批量查询')
+    arg_parser.add_argument('--verbose', action='store_true', help='打印每个请求的访问日志')
+    arg_parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                            help='连接空闲多少秒后关闭；每个打开的连接占用一个请求线程')
+    arg_parser.add_argument('--memory-graph', metavar='MEDICAL_JSON', help='不连接Neo4j，由medical.json构建进程内图谱应答')
+    arg_parser.add_argument('--trace', metavar='SPEC', default=None,
+                            help='开启分阶段计时：on、log(每个请求一行)、json=路径(可含{pid})，逗号分隔；默认取环境变量QA_TRACE')
+    args = arg_parser.parse_args()
+    if args.trace is not None:
+        configure_tracing(args.trace)
+    serve(args.host, args.port, args.workers, args.threads, batch=not args.no_batch, verbose=args.verbose,
+          memory_graph=args.memory_graph, idle_timeout=args.idle_timeout)
+
+
+if __name__ == '__main__':
+    main()
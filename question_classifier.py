@@ -5,10 +5,28 @@
 # Date: 18-10-4
 
 import os
-import pyahocorasick
+from array import array
+from itertools import accumulate
+from entity_extractor import maximal_spans
+from question_types import CUE_WORDS, QUESTION_TYPES
+from lexicon import MASK_TYPES, TYPE_BITS, IntentMatcher, TypedLexicon, dict_fingerprint, load_snapshot, save_snapshot
+
+try:
+    import numpy as np
+except ImportError:
+    # 没有numpy时批量规则判定退化为逐列的纯Python实现，结果一致
+    np = None
+
+# 问句类型规则表，由问题类型注册表按注册顺序导出：(问句类型, 疑问词类别, 实体类型, 含否定词时改判的问句类型)
+QUESTION_RULES = [(question_type.name, question_type.cues, question_type.entity, question_type.deny_type)
+                  for question_type in QUESTION_TYPES.values() if question_type.cues]
 
 class QuestionClassifier:
-    def __init__(self):
+    def __init__(self, use_snapshot=True, rebuild_snapshot=False, overlap_mode='span'):
+        # 实体重叠消解方式：span按命中位置保留极大区间；substring为旧的两两子串比较
+        if overlap_mode not in ('span', 'substring'):
+            raise ValueError('unknown overlap_mode: %s' % overlap_mode)
+        self.overlap_mode = overlap_mode
         cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
         #　特征词路径
         self.disease_path = os.path.join(cur_dir, 'dict/disease.txt')
@@ -19,146 +37,81 @@ class QuestionClassifier:
         self.producer_path = os.path.join(cur_dir, 'dict/producer.txt')
         self.symptom_path = os.path.join(cur_dir, 'dict/symptom.txt')
         self.deny_path = os.path.join(cur_dir, 'dict/deny.txt')
-        # 加载特征词
-        self.disease_wds= [i.strip() for i in open(self.disease_path) if i.strip()]
-        self.department_wds= [i.strip() for i in open(self.department_path) if i.strip()]
-        self.check_wds= [i.strip() for i in open(self.check_path) if i.strip()]
-        self.drug_wds= [i.strip() for i in open(self.drug_path) if i.strip()]
-        self.food_wds= [i.strip() for i in open(self.food_path) if i.strip()]
-        self.producer_wds= [i.strip() for i in open(self.producer_path) if i.strip()]
-        self.symptom_wds= [i.strip() for i in open(self.symptom_path) if i.strip()]
-        self.region_words = set(self.department_wds + self.disease_wds + self.check_wds + self.drug_wds + self.food_wds + self.producer_wds + self.symptom_wds)
-        self.deny_words = [i.strip() for i in open(self.deny_path) if i.strip()]
-        # 构造领域actree
-        self.region_tree = self.build_actree(list(self.region_words))
-        # 构建词典
-        self.wdtype_dict = self.build_wdtype_dict()
-        # 问句疑问词
-        self.symptom_qwds = ['症状', '表征', '现象', '症候', '表现']
-        self.cause_qwds = ['原因','成因', '为什么', '怎么会', '怎样才', '咋样才', '怎样会', '如何会', '为啥', '为何', '如何才会', '怎么才会', '会导致', '会造成']
-        self.acompany_qwds = ['并发症', '并发', '一起发生', '一并发生', '一起出现', '一并出现', '一同发生', '一同出现', '伴随发生', '伴随', '共现']
-        self.food_qwds = ['饮食', '饮用', '吃', '食', '伙食', '膳食', '喝', '菜' ,'忌口', '补品', '保健品', '食谱', '菜谱', '食用', '食物','补品']
-        self.drug_qwds = ['药', '药品', '用药', '胶囊', '口服液', '炎片']
-        self.prevent_qwds = ['预防', '防范', '抵制', '抵御', '防止','躲避','逃避','避开','免得','逃开','避开','避掉','躲开','躲掉','绕开',
-                             '怎样才能不', '怎么才能不', '咋样才能不','咋才能不', '如何才能不',
-                             '怎样才不', '怎么才不', '咋样才不','咋才不', '如何才不',
-                             '怎样才可以不', '怎么才可以不', '咋样才可以不', '咋才可以不', '如何可以不',
-                             '怎样才可不', '怎么才可不', '咋样才可不', '咋才可不', '如何可不']
-        self.lasttime_qwds = ['周期', '多久', '多长时间', '多少时间', '几天', '几年', '多少天', '多少小时', '几个小时', '多少年']
-        self.cureway_qwds = ['怎么治疗', '如何医治', '怎么医治', '怎么治', '怎么医', '如何治', '医治方式', '疗法', '咋治', '怎么办', '咋办', '咋治']
-        self.cureprob_qwds = ['多大概率能治好', '多大几率能治好', '治好希望大么', '几率', '几成', '比例', '可能性', '能治', '可治', '可以治', '可以医']
-        self.easyget_qwds = ['易感人群', '容易感染', '易发人群', '什么人', '哪些人', '感染', '染上', '得上']
-        self.check_qwds = ['检查', '检查项目', '查出', '检查', '测出', '试出']
-        self.belong_qwds = ['属于什么科', '属于', '什么科', '科室']
-        self.cure_qwds = ['治疗什么', '治啥', '治疗啥', '医治啥', '治愈啥', '主治啥', '主治什么', '有什么用', '有何用', '用处', '用途',
-                          '有什么好处', '有什么益处', '有何益处', '用来', '用来做啥', '用来作甚', '需要', '要']
+        # 词典快照，按词典文件指纹判断是否过期
+        self.snapshot_path = os.path.join(cur_dir, 'dict/lexicon.snapshot')
+        dict_paths = [self.disease_path, self.department_path, self.check_path, self.drug_path,
+                      self.food_path, self.producer_path, self.symptom_path, self.deny_path]
+        fingerprint = dict_fingerprint(dict_paths)
+        snapshot = None
+        if use_snapshot and not rebuild_snapshot:
+            snapshot = load_snapshot(self.snapshot_path, fingerprint)
+        if snapshot:
+            self.region_tree = snapshot['region_tree']
+            self.lexicon = TypedLexicon(snapshot['word_masks'])
+            self.deny_words = snapshot['deny_words']
+        else:
+            self.load_dicts()
+            if use_snapshot:
+                try:
+                    save_snapshot(self.snapshot_path, fingerprint, {
+                        'region_tree': self.region_tree,
+                        'word_masks': self.lexicon.word_masks,
+                        'deny_words': self.deny_words,
+                    })
+                except OSError as e:
+                    print('词典快照写入失败: %s' % e)
+        # 问句疑问词按类别在问题类型注册表中登记，这里保留原有的<类别>_qwds属性
+        for cue, words in CUE_WORDS.items():
+            setattr(self, '%s_qwds' % cue, words)
+        # 所有疑问词编译为一个actree，规则表预先解析为位掩码
+        self.intent_matcher = IntentMatcher(list(CUE_WORDS.items()) + [('deny', self.deny_words)])
+        self.deny_mask = self.intent_matcher.mask_of('deny')
+        self.question_rules = [(question_type, self.intent_matcher.mask_of(*cues), TYPE_BITS[entity_type], deny_type)
+                               for question_type, cues, entity_type, deny_type in QUESTION_RULES]
 
         print('model init finished ......')
 
         return
 
+    '''加载特征词，构造带类型位掩码的词表索引及actree'''
+    def load_dicts(self):
+        # 每个词典文件只读一遍，直接累加类型位
+        self.lexicon = TypedLexicon()
+        self.lexicon.add_file(self.disease_path, 'disease')
+        self.lexicon.add_file(self.department_path, 'department')
+        self.lexicon.add_file(self.check_path, 'check')
+        self.lexicon.add_file(self.drug_path, 'drug')
+        self.lexicon.add_file(self.food_path, 'food')
+        self.lexicon.add_file(self.producer_path, 'producer')
+        self.lexicon.add_file(self.symptom_path, 'symptom')
+        self.deny_words = [i.strip() for i in open(self.deny_path) if i.strip()]
+        # 构造领域actree
+        self.region_tree = self.lexicon.build_actree()
+        return
+
     '''分类主函数'''
     def classify(self, question):
         data = {}
-        medical_dict = self.check_medical(question)
+        medical_dict, entity_mask = self.match_medical(question)
         if not medical_dict:
             return {}
         data['args'] = medical_dict
-        #收集问句当中所涉及到的实体类型
-        types = []
-        for type_ in medical_dict.values():
-            types += type_
-        question_type = 'others'
+        # 一遍扫描得到问句中出现的全部疑问词类别
+        cue_mask = self.intent_matcher.match(question)
 
         question_types = []
-
-        # 症状
-        if self.check_words(self.symptom_qwds, question) and ('disease' in types):
-            question_type = 'disease_symptom'
-            question_types.append(question_type)
-
-        if self.check_words(self.symptom_qwds, question) and ('symptom' in types):
-            question_type = 'symptom_disease'
-            question_types.append(question_type)
-
-        # 原因
-        if self.check_words(self.cause_qwds, question) and ('disease' in types):
-            question_type = 'disease_cause'
-            question_types.append(question_type)
-        # 并发症
-        if self.check_words(self.acompany_qwds, question) and ('disease' in types):
-            question_type = 'disease_acompany'
-            question_types.append(question_type)
-
-        # 推荐食品
-        if self.check_words(self.food_qwds, question) and 'disease' in types:
-            deny_status = self.check_words(self.deny_words, question)
-            if deny_status:
-                question_type = 'disease_not_food'
-            else:
-                question_type = 'disease_do_food'
-            question_types.append(question_type)
-
-        #已知食物找疾病
-        if self.check_words(self.food_qwds+self.cure_qwds, question) and 'food' in types:
-            deny_status = self.check_words(self.deny_words, question)
-            if deny_status:
-                question_type = 'food_not_disease'
-            else:
-                question_type = 'food_do_disease'
-            question_types.append(question_type)
-
-        # 推荐药品
-        if self.check_words(self.drug_qwds, question) and 'disease' in types:
-            question_type = 'disease_drug'
-            question_types.append(question_type)
-
-        # 药品治啥病
-        if self.check_words(self.cure_qwds, question) and 'drug' in types:
-            question_type = 'drug_disease'
-            question_types.append(question_type)
-
-        # 疾病接受检查项目
-        if self.check_words(self.check_qwds, question) and 'disease' in types:
-            question_type = 'disease_check'
-            question_types.append(question_type)
-
-        # 已知检查项目查相应疾病
-        if self.check_words(self.check_qwds+self.cure_qwds, question) and 'check' in types:
-            question_type = 'check_disease'
-            question_types.append(question_type)
-
-        #　症状防御
-        if self.check_words(self.prevent_qwds, question) and 'disease' in types:
-            question_type = 'disease_prevent'
-            question_types.append(question_type)
-
-        # 疾病医疗周期
-        if self.check_words(self.lasttime_qwds, question) and 'disease' in types:
-            question_type = 'disease_lasttime'
-            question_types.append(question_type)
-
-        # 疾病治疗方式
-        if self.check_words(self.cureway_qwds, question) and 'disease' in types:
-            question_type = 'disease_cureway'
-            question_types.append(question_type)
-
-        # 疾病治愈可能性
-        if self.check_words(self.cureprob_qwds, question) and 'disease' in types:
-            question_type = 'disease_cureprob'
-            question_types.append(question_type)
-
-        # 疾病易感染人群
-        if self.check_words(self.easyget_qwds, question) and 'disease' in types :
-            question_type = 'disease_easyget'
-            question_types.append(question_type)
+        for question_type, rule_cues, rule_entity, deny_type in self.question_rules:
+            if cue_mask & rule_cues and entity_mask & rule_entity:
+                if deny_type and cue_mask & self.deny_mask:
+                    question_type = deny_type
+                question_types.append(question_type)
 
         # 若没有查到相关的外部查询信息，那么则将该疾病的描述信息返回
-        if question_types == [] and 'disease' in types:
+        if question_types == [] and entity_mask & TYPE_BITS['disease']:
             question_types = ['disease_desc']
 
         # 若没有查到相关的外部查询信息，那么则将该疾病的描述信息返回
-        if question_types == [] and 'symptom' in types:
+        if question_types == [] and entity_mask & TYPE_BITS['symptom']:
             question_types = ['symptom_disease']
 
         # 将多个分类结果进行合并处理，组装成一个字典
@@ -166,57 +119,175 @@ class QuestionClassifier:
 
         return data
 
-    '''构造词对应的类型'''
-    def build_wdtype_dict(self):
-        wd_dict = dict()
-        for wd in self.region_words:
-            wd_dict[wd] = []
-            if wd in self.disease_wds:
-                wd_dict[wd].append('disease')
-            if wd in self.department_wds:
-                wd_dict[wd].append('department')
-            if wd in self.check_wds:
-                wd_dict[wd].append('check')
-            if wd in self.drug_wds:
-                wd_dict[wd].append('drug')
-            if wd in self.food_wds:
-                wd_dict[wd].append('food')
-            if wd in self.symptom_wds:
-                wd_dict[wd].append('symptom')
-            if wd in self.producer_wds:
-                wd_dict[wd].append('producer')
-        return wd_dict
-
-    '''构造actree，加速过滤'''
-    def build_actree(self, wordlist):
-        actree = pyahocorasick.Automaton()
-        for index, word in enumerate(wordlist):
-            actree.add_word(word, (index, word))
-        actree.make_automaton()
-        return actree
+    '''批量分类：实体与疑问词自动机各对整批扫描一遍，结果收集为列式数组后对整批逐条规则判定，结果与逐句classify一致'''
+    def classify_batch(self, questions):
+        # 日志问句重复度很高，整批先去重，每个不同问句只扫描判定一次
+        unique_ids = {}
+        for question in questions:
+            if question not in unique_ids:
+                unique_ids[question] = len(unique_ids)
+        if len(unique_ids) < len(questions):
+            unique_results = self.classify_batch(list(unique_ids))
+            # 首次出现的问句直接使用判定结果，重复出现的问句拷贝一份，避免调用方修改时互相影响
+            seen = [False] * len(unique_results)
+            results = []
+            for question in questions:
+                uid = unique_ids[question]
+                res = unique_results[uid]
+                if seen[uid]:
+                    res = {'args': dict(res['args']), 'question_types': list(res['question_types'])} if res else {}
+                seen[uid] = True
+                results.append(res)
+            return results
+
+        columns = self.scan_batch(questions)
+        n = len(questions)
+        span_qids = columns['span_qids']
+        span_words = columns['span_words']
+        span_masks = columns['span_masks']
+        entity_masks = columns['entity_masks']
+        cue_masks = columns['cue_masks']
+
+        # 按句组装实体参数
+        args_list = [None] * n
+        for qid, wd, wd_mask in zip(span_qids, span_words, span_masks):
+            args = args_list[qid]
+            if args is None:
+                args = args_list[qid] = {}
+            if wd not in args:
+                args[wd] = MASK_TYPES[wd_mask]
+
+        # 对整列逐条规则判定
+        types_list = [[] for _ in range(n)]
+        if np is not None:
+            entity_col = np.frombuffer(entity_masks, dtype=np.uint64)
+            cue_col = np.frombuffer(cue_masks, dtype=np.uint64)
+        for question_type, rule_cues, rule_entity, deny_type in self.question_rules:
+            if np is not None:
+                hits = np.flatnonzero((cue_col & rule_cues != 0) & (entity_col & rule_entity != 0)).tolist()
+            else:
+                hits = [qid for qid in range(n) if cue_masks[qid] & rule_cues and entity_masks[qid] & rule_entity]
+            if deny_type:
+                for qid in hits:
+                    types_list[qid].append(deny_type if cue_masks[qid] & self.deny_mask else question_type)
+            else:
+                for qid in hits:
+                    types_list[qid].append(question_type)
+
+        disease_bit = TYPE_BITS['disease']
+        symptom_bit = TYPE_BITS['symptom']
+        results = []
+        for args, question_types, entity_mask in zip(args_list, types_list, entity_masks):
+            if not args:
+                results.append({})
+                continue
+            if not question_types:
+                if entity_mask & disease_bit:
+                    question_types = ['disease_desc']
+                elif entity_mask & symptom_bit:
+                    question_types = ['symptom_disease']
+            results.append({'args': args, 'question_types': question_types})
+
+        return results
+
+    '''整批扫描，返回列式结果：每个实体命中的句号/起止位置/词/类型掩码，以及每句的实体类型掩码与疑问词掩码'''
+    def scan_batch(self, questions):
+        # 整批用换行拼接后一次扫描，词典词与疑问词均不含换行，命中不会跨句；ends[i]为第i句在拼接文本中的结束位置
+        text = '\n'.join(questions)
+        ends = list(accumulate(len(question) + 1 for question in questions))
+        if self.overlap_mode == 'substring':
+            spans = []
+            for question, end in zip(questions, ends):
+                base = end - len(question) - 1
+                spans += [(base, base, wd, self.lexicon_mask(types))
+                          for wd, types in self.match_medical_substring(question)[0].items()]
+        else:
+            spans = self.match_spans(text)
+
+        # 命中按位置递增输出，用单调指针把位置映射回句号
+        span_qids = array('l')
+        span_masks = array('Q')
+        entity_masks = array('Q', bytes(8 * len(questions)))
+        cue_masks = array('Q', bytes(8 * len(questions)))
+        qid, bound = 0, ends[0] if ends else 0
+        for start, _, _, mask in spans:
+            while start >= bound:
+                qid += 1
+                bound = ends[qid]
+            span_qids.append(qid)
+            span_masks.append(mask)
+            entity_masks[qid] |= mask
+        qid, bound = 0, ends[0] if ends else 0
+        for end_index, mask in self.intent_matcher.actree.iter(text):
+            while end_index >= bound:
+                qid += 1
+                bound = ends[qid]
+            cue_masks[qid] |= mask
+
+        return {
+            'span_qids': span_qids,
+            'span_starts': array('l', [span[0] for span in spans]),
+            'span_ends': array('l', [span[1] for span in spans]),
+            'span_words': [span[2] for span in spans],
+            'span_masks': span_masks,
+            'entity_masks': entity_masks,
+            'cue_masks': cue_masks,
+        }
+
+    '''由类型列表还原类型位掩码'''
+    def lexicon_mask(self, types):
+        mask = 0
+        for type_ in types:
+            mask |= TYPE_BITS[type_]
+        return mask
 
     '''问句过滤'''
     def check_medical(self, question):
+        return self.match_medical(question)[0]
+
+    '''问句过滤，同时返回所涉及实体类型的位掩码'''
+    def match_medical(self, question):
+        if self.overlap_mode == 'substring':
+            return self.match_medical_substring(question)
+        final_dict = {}
+        entity_mask = 0
+        for _, _, wd, mask in self.match_spans(question):
+            if wd not in final_dict:
+                final_dict[wd] = MASK_TYPES[mask]
+                entity_mask |= mask
+
+        return final_dict, entity_mask
+
+    '''问句过滤，返回命中实体的位置：[(起始, 结束, 实体, 类型列表)]，结束位置不含'''
+    def check_medical_spans(self, question):
+        return [(start, end, wd, MASK_TYPES[mask]) for start, end, wd, mask in self.match_spans(question)]
+
+    '''利用actree给出的结束位置做极大区间选择，被其它命中完全覆盖的实体丢弃'''
+    def match_spans(self, question):
+        return maximal_spans(self.region_tree.iter(question))
+
+    '''旧的重叠消解方式：丢弃是其它命中词子串的实体'''
+    def match_medical_substring(self, question):
         region_wds = []
+        region_masks = {}
         for i in self.region_tree.iter(question):
-            wd = i[1][1]
+            wd, mask = i[1]
             region_wds.append(wd)
+            region_masks[wd] = mask
         stop_wds = []
         for wd1 in region_wds:
             for wd2 in region_wds:
                 if wd1 in wd2 and wd1 != wd2:
                     stop_wds.append(wd1)
         final_wds = [i for i in region_wds if i not in stop_wds]
-        final_dict = {i:self.wdtype_dict.get(i) for i in final_wds}
-
-        return final_dict
+        final_dict = {}
+        entity_mask = 0
+        for i in final_wds:
+            mask = region_masks[i]
+            final_dict[i] = MASK_TYPES[mask]
+            entity_mask |= mask
 
-    '''基于特征词进行分类'''
-    def check_words(self, wds, sent):
-        for wd in wds:
-            if wd in sent:
-                return True
-        return False
+        return final_dict, entity_mask
 
 
 if __name__ == '__main__':
@@ -4,6 +4,37 @@
 # Author: lhy<lhy_in_blcu@126.com,https://huangyong.github.io>
 # Date: 18-10-4
 
+# 参数化的Cypher查询模板(模板名 -> 查询文本)随问题类型一起在question_types中注册，这里导出供各模块使用
+from question_types import CYPHER_TEMPLATES, QUESTION_TYPES
+
+# 每类问题使用的查询模板，由问题类型注册表导出
+QUESTION_TEMPLATES = {name: question_type.templates for name, question_type in QUESTION_TYPES.items()}
+
+
+'''由单实体模板拼出一类问题的UNWIND批量查询：所有实体、所有模板一次往返，
+按(模板序号, 实体序号)排序，返回行的顺序与逐条执行单实体模板一致，并附带name/part列标明所属实体与模板'''
+def build_batch_template(template_ids):
+    parts = []
+    for template_id in template_ids:
+        match, columns = CYPHER_TEMPLATES[template_id].replace('$name', 'name').split(' return ')
+        parts.append((match, [i.strip() for i in columns.split(',')]))
+    head = "UNWIND range(0, size($names) - 1) AS i WITH i, $names[i] AS name "
+    if len(parts) == 1:
+        match, columns = parts[0]
+        return head + "%s return i, name, %s ORDER BY i" % (match, ', '.join(columns))
+    subqueries = []
+    for part, (match, columns) in enumerate(parts):
+        subqueries.append("WITH name %s return %d AS part, %s" % (
+            match, part, ', '.join('%s AS `%s`' % (column, column) for column in columns)))
+    columns = parts[0][1]
+    return head + "CALL { %s } return i, name, part, %s ORDER BY part, i" % (
+        ' UNION ALL '.join(subqueries), ', '.join('`%s`' % column for column in columns))
+
+
+# 每类问题的批量查询模板
+BATCH_TEMPLATES = {question_type: build_batch_template(template_ids)
+                   for question_type, template_ids in QUESTION_TEMPLATES.items()}
+
 class QuestionPaser:
 
     '''构建实体节点'''
@@ -28,157 +59,31 @@ class QuestionPaser:
             sql_ = {}
             sql_['question_type'] = question_type
             sql = []
-            if question_type == 'disease_symptom':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'symptom_disease':
-                sql = self.sql_transfer(question_type, entity_dict.get('symptom'))
-
-            elif question_type == 'disease_cause':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'disease_acompany':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'disease_not_food':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'disease_do_food':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'food_not_disease':
-                sql = self.sql_transfer(question_type, entity_dict.get('food'))
-
-            elif question_type == 'food_do_disease':
-                sql = self.sql_transfer(question_type, entity_dict.get('food'))
-
-            elif question_type == 'disease_drug':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'drug_disease':
-                sql = self.sql_transfer(question_type, entity_dict.get('drug'))
-
-            elif question_type == 'disease_check':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'check_disease':
-                sql = self.sql_transfer(question_type, entity_dict.get('check'))
-
-            elif question_type == 'disease_prevent':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'disease_lasttime':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'disease_cureway':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'disease_cureprob':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'disease_easyget':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
-
-            elif question_type == 'disease_desc':
-                sql = self.sql_transfer(question_type, entity_dict.get('disease'))
+            # 按问题类型声明的实体类型取实体，未注册的问题类型不生成查询
+            registered = QUESTION_TYPES.get(question_type)
+            if registered is not None:
+                sql = self.sql_transfer(question_type, entity_dict.get(registered.entity))
 
             if sql:
                 sql_['sql'] = sql
+                # 批量模式按实体列表一次查询
+                sql_['entities'] = list(dict.fromkeys(param['name'] for _, param in sql))
 
                 sqls.append(sql_)
 
         return sqls
 
-    '''针对不同的问题，分开进行处理'''
+    '''针对不同的问题，分开进行处理：每个实体生成(查询模板, 参数)，实体名只作为参数传入'''
     def sql_transfer(self, question_type, entities):
         if not entities:
             return []
 
-        # 查询语句
-        sql = []
-        # 查询疾病的原因
-        if question_type == 'disease_cause':
-            sql = ["MATCH (m:Disease) where m.name = '{0}' return m.name, m.cause".format(i) for i in entities]
-
-        # 查询疾病的防御措施
-        elif question_type == 'disease_prevent':
-            sql = ["MATCH (m:Disease) where m.name = '{0}' return m.name, m.prevent".format(i) for i in entities]
-
-        # 查询疾病的持续时间
-        elif question_type == 'disease_lasttime':
-            sql = ["MATCH (m:Disease) where m.name = '{0}' return m.name, m.cure_lasttime".format(i) for i in entities]
-
-        # 查询疾病的治愈概率
-        elif question_type == 'disease_cureprob':
-            sql = ["MATCH (m:Disease) where m.name = '{0}' return m.name, m.cured_prob".format(i) for i in entities]
-
-        # 查询疾病的治疗方式
-        elif question_type == 'disease_cureway':
-            sql = ["MATCH (m:Disease) where m.name = '{0}' return m.name, m.cure_way".format(i) for i in entities]
-
-        # 查询疾病的易发人群
-        elif question_type == 'disease_easyget':
-            sql = ["MATCH (m:Disease) where m.name = '{0}' return m.name, m.easy_get".format(i) for i in entities]
-
-        # 查询疾病的相关介绍
-        elif question_type == 'disease_desc':
-            sql = ["MATCH (m:Disease) where m.name = '{0}' return m.name, m.desc".format(i) for i in entities]
-
-        # 查询疾病有哪些症状
-        elif question_type == 'disease_symptom':
-            sql = ["MATCH (m:Disease)-[r:has_symptom]->(n:Symptom) where m.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-
-        # 查询症状会导致哪些疾病
-        elif question_type == 'symptom_disease':
-            sql = ["MATCH (m:Disease)-[r:has_symptom]->(n:Symptom) where n.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-
-        # 查询疾病的并发症
-        elif question_type == 'disease_acompany':
-            sql1 = ["MATCH (m:Disease)-[r:acompany_with]->(n:Disease) where m.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql2 = ["MATCH (m:Disease)-[r:acompany_with]->(n:Disease) where n.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql = sql1 + sql2
-        # 查询疾病的忌口
-        elif question_type == 'disease_not_food':
-            sql = ["MATCH (m:Disease)-[r:no_eat]->(n:Food) where m.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-
-        # 查询疾病建议吃的东西
-        elif question_type == 'disease_do_food':
-            sql1 = ["MATCH (m:Disease)-[r:do_eat]->(n:Food) where m.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql2 = ["MATCH (m:Disease)-[r:recommand_eat]->(n:Food) where m.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql = sql1 + sql2
-
-        # 已知忌口查疾病
-        elif question_type == 'food_not_disease':
-            sql = ["MATCH (m:Disease)-[r:no_eat]->(n:Food) where n.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-
-        # 已知推荐查疾病
-        elif question_type == 'food_do_disease':
-            sql1 = ["MATCH (m:Disease)-[r:do_eat]->(n:Food) where n.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql2 = ["MATCH (m:Disease)-[r:recommand_eat]->(n:Food) where n.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql = sql1 + sql2
-
-        # 查询疾病常用药品－药品别名记得扩充
-        elif question_type == 'disease_drug':
-            sql1 = ["MATCH (m:Disease)-[r:common_drug]->(n:Drug) where m.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql2 = ["MATCH (m:Disease)-[r:recommand_drug]->(n:Drug) where m.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql = sql1 + sql2
-
-        # 已知药品查询能够治疗的疾病
-        elif question_type == 'drug_disease':
-            sql1 = ["MATCH (m:Disease)-[r:common_drug]->(n:Drug) where n.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql2 = ["MATCH (m:Disease)-[r:recommand_drug]->(n:Drug) where n.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-            sql = sql1 + sql2
-        # 查询疾病应该进行的检查
-        elif question_type == 'disease_check':
-            sql = ["MATCH (m:Disease)-[r:need_check]->(n:Check) where m.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
-
-        # 已知检查查询疾病
-        elif question_type == 'check_disease':
-            sql = ["MATCH (m:Disease)-[r:need_check]->(n:Check) where n.name = '{0}' return m.name, r.name, n.name".format(i) for i in entities]
+        # 查询语句，同一问题类型有多个模板时按模板顺序排列
+        template_ids = QUESTION_TEMPLATES.get(question_type, [])
+        sql = [(template_id, {'name': i}) for template_id in template_ids for i in entities]
 
         return sql
 
 
-
 if __name__ == '__main__':
     handler = QuestionPaser()
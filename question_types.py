@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: question_types.py
+# 问题类型注册表：疑问词类别与其疑问词表，以及每类问题在问句中实体的类型、分类规则、Cypher查询与回复模板，
+# QuestionClassifier、QuestionPaser与AnswerSearcher都从这里取，新增问题类型(含新的疑问词类别与查询)只改本文件
+
+
+def slot(columns, where=None, sep='；', join=None, exclude_subject=False):
+    """回复中的一个列表槽位：取值列(可为多列)、只取r.name等于where的行、列表分隔符、
+    数组属性的连接符、是否跳过与主语相同的值"""
+    if isinstance(columns, str):
+        columns = (columns,)
+    return {'columns': columns, 'where': where, 'sep': sep, 'join': join, 'exclude_subject': exclude_subject}
+
+
+class QuestionType:
+    """一类问题
+    entity: 查询所用实体的类型(disease/symptom/food/drug/check)
+    queries: [(查询模板名, Cypher)]，实体名以$name传入；多个查询时结果行按顺序拼接
+    answer: 回复模板(格式串, 主语所在列, 列表槽位)，格式串中{subject}为主语，{0}、{1}依次为各槽位去重后的列表
+    cues: 分类规则的疑问词类别(CUE_WORDS中的类别名)，问句含其中任一类且含entity类型的实体时命中；为空则不参与规则判定
+    deny_type: 问句含否定词时改判的问题类型"""
+    def __init__(self, name, entity, queries, answer, cues=(), deny_type=None):
+        self.name = name
+        self.entity = entity
+        self.queries = list(queries)
+        self.templates = [template_id for template_id, _ in self.queries]
+        self.answer = answer
+        self.cues = tuple(cues)
+        self.deny_type = deny_type
+
+
+# 疑问词类别 -> 疑问词表，QuestionClassifier把全部类别与否定词(类别名deny)编译进同一个actree
+CUE_WORDS = {}
+# 问题类型名 -> QuestionType，带分类规则的类型按注册顺序依次判定
+QUESTION_TYPES = {}
+# 查询模板名 -> Cypher，由各问题类型注册的查询汇总而来；查询参数化，服务端可复用执行计划，实体名中的引号也不会破坏语句
+CYPHER_TEMPLATES = {}
+
+
+def register_cues(name, words):
+    # deny为dict/deny.txt中否定词的类别名
+    if name in CUE_WORDS or name == 'deny':
+        raise ValueError('cue category %s is already registered' % name)
+    CUE_WORDS[name] = list(words)
+
+
+def register(question_type):
+    if question_type.name in QUESTION_TYPES:
+        raise ValueError('question type %s is already registered' % question_type.name)
+    for cue in question_type.cues:
+        if cue not in CUE_WORDS:
+            raise ValueError('unknown cue category: %s' % cue)
+    # 同名查询模板可被多个问题类型共用，但文本必须一致
+    for template_id, cypher in question_type.queries:
+        if CYPHER_TEMPLATES.get(template_id, cypher) != cypher:
+            raise ValueError('query template %s is already registered with a different query' % template_id)
+    CYPHER_TEMPLATES.update(question_type.queries)
+    QUESTION_TYPES[question_type.name] = question_type
+    return question_type
+
+
+# 问句疑问词
+register_cues('symptom', ['症状', '表征', '现象', '症候', '表现'])
+register_cues('cause', ['原因','成因', '为什么', '怎么会', '怎样才', '咋样才', '怎样会', '如何会', '为啥', '为何', '如何才会', '怎么才会', '会导致', '会造成'])
+register_cues('acompany', ['并发症', '并发', '一起发生', '一并发生', '一起出现', '一并出现', '一同发生', '一同出现', '伴随发生', '伴随', '共现'])
+register_cues('food', ['饮食', '饮用', '吃', '食', '伙食', '膳食', '喝', '菜' ,'忌口', '补品', '保健品', '食谱', '菜谱', '食用', '食物','补品'])
+register_cues('drug', ['药', '药品', '用药', '胶囊', '口服液', '炎片'])
+register_cues('prevent', ['预防', '防范', '抵制', '抵御', '防止','躲避','逃避','避开','免得','逃开','避开','避掉','躲开','躲掉','绕开',
+                          '怎样才能不', '怎么才能不', '咋样才能不','咋才能不', '如何才能不',
+                          '怎样才不', '怎么才不', '咋样才不','咋才不', '如何才不',
+                          '怎样才可以不', '怎么才可以不', '咋样才可以不', '咋才可以不', '如何可以不',
+                          '怎样才可不', '怎么才可不', '咋样才可不', '咋才可不', '如何可不'])
+register_cues('lasttime', ['周期', '多久', '多长时间', '多少时间', '几天', '几年', '多少天', '多少小时', '几个小时', '多少年'])
+register_cues('cureway', ['怎么治疗', '如何医治', '怎么医治', '怎么治', '怎么医', '如何治', '医治方式', '疗法', '咋治', '怎么办', '咋办', '咋治'])
+register_cues('cureprob', ['多大概率能治好', '多大几率能治好', '治好希望大么', '几率', '几成', '比例', '可能性', '能治', '可治', '可以治', '可以医'])
+register_cues('easyget', ['易感人群', '容易感染', '易发人群', '什么人', '哪些人', '感染', '染上', '得上'])
+register_cues('check', ['检查', '检查项目', '查出', '检查', '测出', '试出'])
+register_cues('belong', ['属于什么科', '属于', '什么科', '科室'])
+register_cues('cure', ['治疗什么', '治啥', '治疗啥', '医治啥', '治愈啥', '主治啥', '主治什么', '有什么用', '有何用', '用处', '用途',
+                       '有什么好处', '有什么益处', '有何益处', '用来', '用来做啥', '用来作甚', '需要', '要'])
+
+# 查询疾病有哪些症状
+register(QuestionType('disease_symptom', 'disease', [
+    ('disease_symptom', "MATCH (m:Disease)-[r:has_symptom]->(n:Symptom) where m.name = $name return m.name, r.name, n.name"),
+], ('{subject}的症状包括：{0}', 'm.name', [slot('n.name')]), cues=('symptom',)))
+# 查询症状会导致哪些疾病
+register(QuestionType('symptom_disease', 'symptom', [
+    ('symptom_disease', "MATCH (m:Disease)-[r:has_symptom]->(n:Symptom) where n.name = $name return m.name, r.name, n.name"),
+], ('症状{subject}可能染上的疾病有：{0}', 'n.name', [slot('m.name')]), cues=('symptom',)))
+# 查询疾病的原因
+register(QuestionType('disease_cause', 'disease', [
+    ('disease_cause', "MATCH (m:Disease) where m.name = $name return m.name, m.cause"),
+], ('{subject}可能的成因有：{0}', 'm.name', [slot('m.cause')]), cues=('cause',)))
+# 查询疾病的并发症：正反两个方向，取每行中不是主语的一端
+register(QuestionType('disease_acompany', 'disease', [
+    ('disease_acompany_with', "MATCH (m:Disease)-[r:acompany_with]->(n:Disease) where m.name = $name return m.name, r.name, n.name"),
+    ('disease_acompany_with_reverse', "MATCH (m:Disease)-[r:acompany_with]->(n:Disease) where n.name = $name return m.name, r.name, n.name"),
+], ('{subject}的症状包括：{0}', 'm.name', [slot(('n.name', 'm.name'), exclude_subject=True)]), cues=('acompany',)))
+# 查询疾病建议吃的东西
+register(QuestionType('disease_do_food', 'disease', [
+    ('disease_do_eat', "MATCH (m:Disease)-[r:do_eat]->(n:Food) where m.name = $name return m.name, r.name, n.name"),
+    ('disease_recommand_eat', "MATCH (m:Disease)-[r:recommand_eat]->(n:Food) where m.name = $name return m.name, r.name, n.name"),
+], ('{subject}宜食的食物包括有：{0}\n推荐食谱包括有：{1}', 'm.name',
+    [slot('n.name', where='宜吃', sep=';'), slot('n.name', where='推荐食谱', sep=';')]),
+    cues=('food',), deny_type='disease_not_food'))
+# 已知推荐查疾病
+register(QuestionType('food_do_disease', 'food', [
+    ('food_do_eat', "MATCH (m:Disease)-[r:do_eat]->(n:Food) where n.name = $name return m.name, r.name, n.name"),
+    ('food_recommand_eat', "MATCH (m:Disease)-[r:recommand_eat]->(n:Food) where n.name = $name return m.name, r.name, n.name"),
+], ('患有{0}的人建议多试试{subject}', 'n.name', [slot('m.name')]), cues=('food', 'cure'), deny_type='food_not_disease'))
+# 查询疾病常用药品－药品别名记得扩充
+register(QuestionType('disease_drug', 'disease', [
+    ('disease_common_drug', "MATCH (m:Disease)-[r:common_drug]->(n:Drug) where m.name = $name return m.name, r.name, n.name"),
+    ('disease_recommand_drug', "MATCH (m:Disease)-[r:recommand_drug]->(n:Drug) where m.name = $name return m.name, r.name, n.name"),
+], ('{subject}通常的使用的药品包括：{0}', 'm.name', [slot('n.name')]), cues=('drug',)))
+# 已知药品查询能够治疗的疾病
+register(QuestionType('drug_disease', 'drug', [
+    ('drug_common_drug', "MATCH (m:Disease)-[r:common_drug]->(n:Drug) where n.name = $name return m.name, r.name, n.name"),
+    ('drug_recommand_drug', "MATCH (m:Disease)-[r:recommand_drug]->(n:Drug) where n.name = $name return m.name, r.name, n.name"),
+], ('{subject}主治的疾病有{0},可以试试', 'n.name', [slot('m.name')]), cues=('cure',)))
+# 查询疾病应该进行的检查
+register(QuestionType('disease_check', 'disease', [
+    ('disease_check', "MATCH (m:Disease)-[r:need_check]->(n:Check) where m.name = $name return m.name, r.name, n.name"),
+], ('{subject}通常可以通过以下方式检查出来：{0}', 'm.name', [slot('n.name')]), cues=('check',)))
+# 已知检查查询疾病
+register(QuestionType('check_disease', 'check', [
+    ('check_disease', "MATCH (m:Disease)-[r:need_check]->(n:Check) where n.name = $name return m.name, r.name, n.name"),
+], ('通常可以通过{subject}检查出来的疾病有{0}', 'n.name', [slot('m.name')]), cues=('check', 'cure')))
+# 查询疾病的防御措施
+register(QuestionType('disease_prevent', 'disease', [
+    ('disease_prevent', "MATCH (m:Disease) where m.name = $name return m.name, m.prevent"),
+], ('{subject}的预防措施包括：{0}', 'm.name', [slot('m.prevent')]), cues=('prevent',)))
+# 查询疾病的持续时间
+register(QuestionType('disease_lasttime', 'disease', [
+    ('disease_lasttime', "MATCH (m:Disease) where m.name = $name return m.name, m.cure_lasttime"),
+], ('{subject}治疗可能持续的周期为：{0}', 'm.name', [slot('m.cure_lasttime')]), cues=('lasttime',)))
+# 查询疾病的治疗方式
+register(QuestionType('disease_cureway', 'disease', [
+    ('disease_cureway', "MATCH (m:Disease) where m.name = $name return m.name, m.cure_way"),
+], ('{subject}可以尝试如下治疗：{0}', 'm.name', [slot('m.cure_way', join=';')]), cues=('cureway',)))
+# 查询疾病的治愈概率
+register(QuestionType('disease_cureprob', 'disease', [
+    ('disease_cureprob', "MATCH (m:Disease) where m.name = $name return m.name, m.cured_prob"),
+], ('{subject}治愈的概率为（仅供参考）：{0}', 'm.name', [slot('m.cured_prob')]), cues=('cureprob',)))
+# 查询疾病的易发人群
+register(QuestionType('disease_easyget', 'disease', [
+    ('disease_easyget', "MATCH (m:Disease) where m.name = $name return m.name, m.easy_get"),
+], ('{subject}的易感人群包括：{0}', 'm.name', [slot('m.easy_get')]), cues=('easyget',)))
+
+# 以下类型不直接由规则命中：否定改判得到，或在没有命中任何规则时作为默认回复
+# 查询疾病的忌口
+register(QuestionType('disease_not_food', 'disease', [
+    ('disease_no_eat', "MATCH (m:Disease)-[r:no_eat]->(n:Food) where m.name = $name return m.name, r.name, n.name"),
+], ('{subject}忌食的食物包括有：{0}', 'm.name', [slot('n.name')])))
+# 已知忌口查疾病
+register(QuestionType('food_not_disease', 'food', [
+    ('food_no_eat', "MATCH (m:Disease)-[r:no_eat]->(n:Food) where n.name = $name return m.name, r.name, n.name"),
+], ('患有{0}的人最好不要吃{subject}', 'n.name', [slot('m.name')])))
+# 查询疾病的相关介绍
+register(QuestionType('disease_desc', 'disease', [
+    ('disease_desc', "MATCH (m:Disease) where m.name = $name return m.name, m.desc"),
+], ('{subject},熟悉一下：{0}', 'm.name', [slot('m.desc')])))
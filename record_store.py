@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: record_store.py
+# 按需读取的疾病记录：内存中只保留疾病名 -> (行偏移, 行长度) 索引，访问时才从medical.json读出该行并解码，
+# 解码结果放入容量很小的LRU；索引按源文件的大小与修改时间缓存在数据文件旁(data/medical.index)，启动时不再扫描全文
+
+import json
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+from file_util import atomic_write, source_stamp
+
+cur_dir = '/'.join(os.path.abspath(__file__).split('/')[:-1])
+
+INDEX_MAGIC = b'MQAI'
+INDEX_VERSION = 1
+# 索引文件头：魔数、版本、源文件大小与修改时间(ns)、记录数；其后为偏移数组、长度数组、名称列表(JSON)
+INDEX_HEADER = struct.Struct('<4sHxxQQI')
+
+# 记录行中的顶层name字段；medical.json中name之前只有_id这样的嵌套对象，取第一个即可
+NAME_PATTERN = re.compile(rb'"name"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def default_index_path(data_path):
+    """索引文件与数据文件放在一起：data/medical.json -> data/medical.index"""
+    return os.path.splitext(data_path)[0] + '.index'
+
+
+def line_name(line):
+    """不解码整行，只取出name；匹配不到时退回完整解析"""
+    match = NAME_PATTERN.search(line)
+    if match:
+        return json.loads(match.group(1))
+    return json.loads(line)['name']
+
+
+def scan_index(data_path):
+    """顺序扫描一遍medical.json，返回(名称列表, 偏移数组, 长度数组)；同名记录取最后一条，与整表读入的dict一致"""
+    positions = {}
+    offset = 0
+    with open(data_path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                positions[line_name(line)] = (offset, len(line))
+            offset += len(line)
+    names = list(positions)
+    offsets = array('Q', (positions[name][0] for name in names))
+    lengths = array('I', (positions[name][1] for name in names))
+    return names, offsets, lengths
+
+
+def save_index(path, stamp, names, offsets, lengths):
+    with atomic_write(path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stamp[0], stamp[1], len(names)))
+        f.write(offsets.tobytes())
+        f.write(lengths.tobytes())
+        f.write(json.dumps(names, ensure_ascii=False).encode('utf-8'))
+
+
+def load_index(path, stamp):
+    """读取与源文件一致的索引，不存在、格式不符或已过期时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < INDEX_HEADER.size:
+        return None
+    magic, version, size, mtime_ns, count = INDEX_HEADER.unpack_from(data, 0)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION or (size, mtime_ns) != tuple(stamp):
+        return None
+    pos = INDEX_HEADER.size
+    offsets = array('Q', data[pos:pos + 8 * count])
+    pos += 8 * count
+    lengths = array('I', data[pos:pos + 4 * count])
+    pos += 4 * count
+    names = json.loads(data[pos:].decode('utf-8'))
+    if len(names) != count or len(offsets) != count or len(lengths) != count:
+        return None
+    return names, offsets, lengths
+
+
+class LazyRecordStore:
+    """按疾病名取记录的只读映射，接口与整表读入的dict(及graph_file.DiseaseRecords)一致；
+    读文件用os.pread，不共享文件位置，可在多线程与fork出的子进程中直接使用"""
+    def __init__(self, data_path, index_path=None, cache_size=64):
+        self.data_path = data_path
+        index_path = index_path or default_index_path(data_path)
+        stamp = source_stamp(data_path)
+        index = load_index(index_path, stamp)
+        if index is None:
+            index = scan_index(data_path)
+            try:
+                save_index(index_path, stamp, *index)
+            except OSError as e:
+                print('无法写入记录索引 %s: %s' % (index_path, e), file=sys.stderr)
+        names, self.offsets, self.lengths = index
+        self.positions = {name: i for i, name in enumerate(names)}
+        self.fd = os.open(data_path, os.O_RDONLY)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def read_record(self, i):
+        return json.loads(os.pread(self.fd, self.lengths[i], self.offsets[i]))
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def __getitem__(self, name):
+        with self.lock:
+            record = self.cache.get(name)
+            if record is not None:
+                self.cache.move_to_end(name)
+                self.hits += 1
+                return record
+        i = self.positions[name]
+        record = self.read_record(i)
+        with self.lock:
+            self.misses += 1
+            self.cache[name] = record
+            self.cache.move_to_end(name)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return record
+
+    def get(self, name, default=None):
+        if name not in self.positions:
+            return default
+        return self[name]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def keys(self):
+        return iter(self)
+
+    def stats(self):
+        with self.lock:
+            return {'records': len(self.positions), 'cached': len(self.cache), 'hits': self.hits, 'misses': self.misses}
+
+
+if __name__ == '__main__':
+    import argparse
+    arg_parser = argparse.ArgumentParser(description='为medical.json生成按疾病名的记录偏移索引')
+    arg_parser.add_argument('--data', default=os.path.join(cur_dir, 'data/medical.json'))
+    arg_parser.add_argument('--out', default=None, help='默认与数据文件同目录，扩展名为.index')
+    args = arg_parser.parse_args()
+    out = args.out or default_index_path(args.data)
+    index = scan_index(args.data)
+    save_index(out, source_stamp(args.data), *index)
+    print('%s: %d records' % (out, len(index[0])))
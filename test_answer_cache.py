@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: test_answer_cache.py
+# 查询结果缓存的测试：LRU淘汰、条目过期、图谱版本标记变化(含其它进程改写)后失效；
+# 时钟由测试注入，版本标记写在临时目录；python -m unittest test_answer_cache
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from answer_cache import AnswerCache, bump_graph_version, read_graph_version
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class AnswerCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.version_path = os.path.join(self.tmp_dir, 'graph.version')
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def cache(self, **kwargs):
+        kwargs.setdefault('version_path', self.version_path)
+        kwargs.setdefault('clock', self.clock)
+        return AnswerCache(**kwargs)
+
+    def test_lru_eviction(self):
+        cache = self.cache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # 访问a后b成为最久未用的条目
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_put_existing_key_refreshes(self):
+        cache = self.cache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('a', 10)
+        cache.put('c', 3)
+        self.assertEqual(cache.get('a'), 10)
+        self.assertIsNone(cache.get('b'))
+
+    def test_ttl_expiry(self):
+        cache = self.cache(ttl=10, check_interval=1000)
+        cache.put('a', 1)
+        cache.put('b', 2, ttl=30)
+        self.clock.advance(9.9)
+        self.assertEqual(cache.get('a'), 1)
+        self.clock.advance(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        self.clock.advance(20)
+        self.assertIsNone(cache.get('b'))
+        stats = cache.stats()
+        self.assertEqual((stats['expirations'], stats['hits'], stats['misses']), (2, 2, 2))
+        self.assertEqual(len(cache), 0)
+
+    def test_bump_in_process(self):
+        cache = self.cache(check_interval=1000)
+        cache.put('a', 1)
+        version = bump_graph_version(self.version_path)
+        self.assertEqual(read_graph_version(self.version_path), version)
+        # 本进程内重建图谱时直接清空，不等版本检查
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_bump_from_other_process(self):
+        cache = self.cache(check_interval=1.0)
+        cache.put('a', 1)
+        subprocess.run([sys.executable, '-c', 'import sys; from answer_cache import bump_graph_version; '
+                        'bump_graph_version(sys.argv[1])', self.version_path],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        # 检查间隔未到时仍返回旧结果，到期后读到新的版本标记并整体失效
+        self.assertEqual(cache.get('a'), 1)
+        self.clock.advance(1.0)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.version, read_graph_version(self.version_path))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+        # 版本不变时不再失效
+        cache.put('a', 2)
+        self.clock.advance(1.0)
+        self.assertEqual(cache.get('a'), 2)
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_key_keeps_case(self):
+        self.assertEqual(AnswerCache.make_key('disease_desc', ' ABC '), ('disease_desc', 'ABC'))
+        self.assertNotEqual(AnswerCache.make_key('disease_desc', 'abc'), AnswerCache.make_key('disease_desc', 'ABC'))
+
+
+if __name__ == '__main__':
+    unittest.main()
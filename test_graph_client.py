@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: test_graph_client.py
+# GraphClient的重试测试：以FakeGraph代替py2neo Graph，模拟发出查询或取结果时连接断开；python -m unittest test_graph_client
+
+import unittest
+
+from py2neo.errors import ConnectionBroken
+
+from graph_client import GraphClient
+
+
+class FakeCursor:
+    def __init__(self, graph, rows):
+        self.graph = graph
+        self.rows = rows
+
+    def data(self):
+        if self.graph.fetch_failures:
+            self.graph.fetch_failures -= 1
+            raise ConnectionBroken('connection lost while fetching')
+        return self.rows
+
+
+class FakeGraph:
+    """auto(readonly).run(cypher, parameters)返回游标；run_failures/fetch_failures为发出查询/取结果时依次失败的次数"""
+    def __init__(self, rows, run_failures=0, fetch_failures=0):
+        self.rows = rows
+        self.run_failures = run_failures
+        self.fetch_failures = fetch_failures
+        self.runs = 0
+
+    def auto(self, readonly=True):
+        return self
+
+    def run(self, cypher, parameters=None):
+        self.runs += 1
+        if self.run_failures:
+            self.run_failures -= 1
+            raise ConnectionBroken('connection lost while running')
+        return FakeCursor(self, self.rows)
+
+
+def client(graph, **kwargs):
+    kwargs.setdefault('retries', 3)
+    return GraphClient(graph=graph, backoff=0.001, max_backoff=0.001, timeout=5.0, **kwargs)
+
+
+class GraphClientTest(unittest.TestCase):
+    ROWS = [{'m.name': '感冒'}]
+
+    def test_data_retries_fetch(self):
+        graph = FakeGraph(self.ROWS, fetch_failures=2)
+        graph_client = client(graph)
+        self.assertEqual(graph_client.data('MATCH (m) RETURN m.name', {}), self.ROWS)
+        # 取结果失败后整条查询重新发出
+        self.assertEqual(graph.runs, 3)
+        stats = graph_client.pool_stats()
+        self.assertEqual((stats['queries'], stats['retries'], stats['failures']), (1, 2, 0))
+
+    def test_data_retries_run(self):
+        graph = FakeGraph(self.ROWS, run_failures=1)
+        self.assertEqual(client(graph).data('MATCH (m) RETURN m.name'), self.ROWS)
+        self.assertEqual(graph.runs, 2)
+
+    def test_data_gives_up(self):
+        graph = FakeGraph(self.ROWS, fetch_failures=5)
+        graph_client = client(graph, retries=2)
+        with self.assertRaises(ConnectionBroken):
+            graph_client.data('MATCH (m) RETURN m.name')
+        self.assertEqual(graph.runs, 3)
+        self.assertEqual(graph_client.pool_stats()['failures'], 1)
+
+    def test_write_not_retried(self):
+        graph = FakeGraph(self.ROWS, fetch_failures=1)
+        with self.assertRaises(ConnectionBroken):
+            client(graph).data('CREATE (m)', readonly=False)
+        self.assertEqual(graph.runs, 1)
+
+    def test_run_returns_cursor(self):
+        graph = FakeGraph(self.ROWS, run_failures=1)
+        cursor = client(graph).run('MATCH (m) RETURN m.name')
+        self.assertEqual(cursor.data(), self.ROWS)
+        self.assertEqual(graph.runs, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: test_graph_file.py
+# 二进制图谱文件的读取测试：完整文件可用，截断或魔数不符的文件回退到读取JSON；python -m unittest test_graph_file
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from graph_file import GraphFile, compile_graph_file, open_medical_records
+
+RECORDS = [
+    {'name': '感冒', 'desc': '感冒的介绍', 'symptom': ['发热', '咳嗽'], 'common_drug': ['阿司匹林'],
+     'cure_way': ['药物治疗'], 'cure_lasttime': '1周', 'cured_prob': '90%', 'cure_department': ['内科']},
+    {'name': '肺炎', 'desc': '肺炎的介绍', 'symptom': ['发热'], 'acompany': ['感冒'], 'check': ['胸部CT']},
+]
+
+
+class GraphFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.tmp_dir, 'medical.json')
+        self.graph_path = os.path.join(self.tmp_dir, 'medical.graph')
+        with open(self.data_path, 'w', encoding='utf-8') as f:
+            for record in RECORDS:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        compile_graph_file(self.data_path, self.graph_path)
+        with open(self.graph_path, 'rb') as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def rewrite(self, data):
+        with open(self.graph_path, 'wb') as f:
+            f.write(data)
+
+    def test_open_records(self):
+        records = open_medical_records(self.data_path, self.graph_path)
+        self.assertEqual(sorted(records), ['感冒', '肺炎'])
+        self.assertEqual(records['感冒']['symptom'], ['发热', '咳嗽'])
+        self.assertEqual(records['肺炎']['acompany'], ['感冒'])
+        records.graph_file.close()
+
+    def test_truncated_file(self):
+        # 文件头不完整、只有文件头、截在中间、截掉最后一个数据段的末尾(末尾至多7字节为对齐填充)
+        for size in (7, 12, len(self.data) // 2, len(self.data) - 9):
+            self.rewrite(self.data[:size])
+            with self.assertRaises(ValueError):
+                GraphFile(self.graph_path)
+            self.assertIsNone(open_medical_records(self.data_path, self.graph_path))
+
+    def test_wrong_magic(self):
+        self.rewrite(b'XXXX' + self.data[4:])
+        with self.assertRaises(ValueError):
+            GraphFile(self.graph_path)
+        self.assertIsNone(open_medical_records(self.data_path, self.graph_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
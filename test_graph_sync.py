@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: test_graph_sync.py
+# 增量同步的测试：FakeGraphClient按GraphSync发出的几种语句在内存中维护节点与关系，
+# 每次增量同步后的图谱须与对新数据整表同步到空图的结果一致；python -m unittest test_graph_sync
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from graph_sync import MANIFEST_VERSION, load_manifest, plan_sync, scan_records, sync
+
+DELETE_EDGES = re.compile(r'UNWIND \$pairs AS pair MATCH \(p:(\w+) \{name: pair\[0\]\}\)-\[r:(\w+) \{name: \$rel_name\}\]->'
+                          r'\(q:(\w+) \{name: pair\[1\]\}\) DELETE r$')
+DELETE_NODES = re.compile(r'UNWIND \$names AS name MATCH \(n:(\w+) \{name: name\}\) DETACH DELETE n$')
+MERGE_NODES = re.compile(r'UNWIND \$names AS name MERGE \(:(\w+) \{name: name\}\)$')
+MERGE_DISEASES = re.compile(r'UNWIND \$rows AS row MERGE \(n:Disease \{name: row.name\}\) SET n = row$')
+MERGE_EDGES = re.compile(r'UNWIND \$pairs AS pair MATCH \(p:(\w+) \{name: pair\[0\]\}\), \(q:(\w+) \{name: pair\[1\]\}\) '
+                         r'MERGE \(p\)-\[:(\w+) \{name: \$rel_name\}\]->\(q\)$')
+
+
+class FakeGraphClient:
+    """只认识GraphSync所用语句的内存图谱：nodes为(标签, 名称) -> 属性，edges为(关系类型, 关系名, 起点, 终点)集合"""
+    def __init__(self):
+        self.nodes = {}
+        self.edges = set()
+        self.queries = 0
+
+    def run(self, query, params, readonly=True):
+        self.queries += 1
+        match = DELETE_EDGES.match(query)
+        if match:
+            start_label, rel_type, end_label = match.groups()
+            for start, end in params['pairs']:
+                self.edges.discard((rel_type, params['rel_name'], (start_label, start), (end_label, end)))
+            return
+        match = DELETE_NODES.match(query)
+        if match:
+            for name in params['names']:
+                node = (match.group(1), name)
+                self.nodes.pop(node, None)
+                self.edges = {edge for edge in self.edges if node not in edge[2:]}
+            return
+        match = MERGE_NODES.match(query)
+        if match:
+            for name in params['names']:
+                self.nodes.setdefault((match.group(1), name), {'name': name})
+            return
+        if MERGE_DISEASES.match(query):
+            for row in params['rows']:
+                self.nodes[('Disease', row['name'])] = dict(row)
+            return
+        match = MERGE_EDGES.match(query)
+        if match:
+            start_label, end_label, rel_type = match.groups()
+            for start, end in params['pairs']:
+                # MATCH不到任一端点时不建边
+                if (start_label, start) in self.nodes and (end_label, end) in self.nodes:
+                    self.edges.add((rel_type, params['rel_name'], (start_label, start), (end_label, end)))
+            return
+        raise AssertionError('unexpected query: %s' % query)
+
+
+def disease(name, **fields):
+    record = {'name': name, 'desc': '%s的介绍' % name}
+    record.update(fields)
+    return record
+
+
+BASE = [
+    disease('感冒', symptom=['发热', '咳嗽'], common_drug=['阿司匹林'], cure_department=['内科', '呼吸内科'],
+            drug_detail=['拜耳(阿司匹林)']),
+    disease('肺炎', symptom=['发热'], acompany=['感冒'], common_drug=['阿司匹林', '头孢'], check=['胸部CT']),
+    disease('胃炎', not_eat=['辣椒'], do_eat=['小米粥'], acompany=['肺结核']),
+]
+
+
+class GraphSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.tmp_dir, 'medical.json')
+        self.manifest_path = os.path.join(self.tmp_dir, 'graph.manifest.json')
+        self.client = FakeGraphClient()
+        # 同步成功后会更新data/graph.version，测试中不写仓库里的文件
+        patcher = mock.patch('graph_sync.bump_graph_version')
+        self.bump_graph_version = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, records, path=None):
+        with open(path or self.data_path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def scan(self, records):
+        path = os.path.join(self.tmp_dir, 'scan.json')
+        self.write(records, path)
+        return scan_records(path)
+
+    def sync(self, records, client=None, manifest_path=None):
+        self.write(records)
+        return sync(client or self.client, self.data_path, manifest_path or self.manifest_path, batch_size=2)[0]
+
+    def assertMatchesFullSync(self, records):
+        """增量同步后的图谱与整表同步到空图的结果一致"""
+        full = FakeGraphClient()
+        self.sync(records, client=full, manifest_path=os.path.join(self.tmp_dir, 'full.manifest.json'))
+        self.assertEqual(self.client.nodes, full.nodes)
+        self.assertEqual(self.client.edges, full.edges)
+
+    def edge(self, rel_type, rel_name, start, end):
+        return (rel_type, rel_name, start, end)
+
+    def test_add(self):
+        summary = self.sync(BASE)
+        self.assertEqual(summary['added'], 3)
+        self.assertIn(('Symptom', '发热'), self.client.nodes)
+        self.assertIn(self.edge('acompany_with', '并发症', ('Disease', '肺炎'), ('Disease', '感冒')), self.client.edges)
+        # 并发症终点肺结核没有疾病记录，关系不落到图谱中
+        self.assertNotIn(('Disease', '肺结核'), self.client.nodes)
+        self.assertFalse(any(edge[3] == ('Disease', '肺结核') for edge in self.client.edges))
+        self.assertEqual(load_manifest(self.manifest_path).keys(), {'感冒', '肺炎', '胃炎'})
+
+        records = BASE + [disease('肺结核', symptom=['咳嗽'])]
+        summary = self.sync(records)
+        self.assertEqual((summary['added'], summary['changed'], summary['removed']), (1, 0, 0))
+        # 新出现的疾病节点让未变化记录中指向它的关系生效
+        self.assertIn(self.edge('acompany_with', '并发症', ('Disease', '胃炎'), ('Disease', '肺结核')), self.client.edges)
+        self.assertMatchesFullSync(records)
+
+    def test_unchanged(self):
+        self.sync(BASE)
+        queries = self.client.queries
+        summary = self.sync(BASE)
+        self.assertEqual((summary['added'], summary['changed'], summary['removed']), (0, 0, 0))
+        self.assertEqual(self.client.queries, queries)
+        self.assertEqual(self.bump_graph_version.call_count, 1)
+
+    def test_change(self):
+        self.sync(BASE)
+        records = [disease('感冒', symptom=['咳嗽', '流涕'], common_drug=['阿司匹林'], cure_department=['内科'],
+                           desc='新的介绍')] + BASE[1:]
+        summary = self.sync(records)
+        self.assertEqual((summary['added'], summary['changed'], summary['removed']), (0, 1, 0))
+        self.assertEqual(self.client.nodes[('Disease', '感冒')]['desc'], '新的介绍')
+        # 感冒不再有发热，但肺炎仍引用该症状节点
+        self.assertIn(('Symptom', '发热'), self.client.nodes)
+        self.assertNotIn(self.edge('has_symptom', '症状', ('Disease', '感冒'), ('Symptom', '发热')), self.client.edges)
+        self.assertIn(self.edge('has_symptom', '症状', ('Disease', '肺炎'), ('Symptom', '发热')), self.client.edges)
+        # 只有感冒引用的科室层级与厂商被删除
+        self.assertNotIn(('Department', '呼吸内科'), self.client.nodes)
+        self.assertNotIn(('Producer', '拜耳'), self.client.nodes)
+        self.assertMatchesFullSync(records)
+
+    def test_remove(self):
+        self.sync(BASE)
+        records = BASE[1:]
+        summary = self.sync(records)
+        self.assertEqual((summary['added'], summary['changed'], summary['removed']), (0, 0, 1))
+        self.assertNotIn(('Disease', '感冒'), self.client.nodes)
+        self.assertNotIn(('Symptom', '咳嗽'), self.client.nodes)
+        # 肺炎的并发症终点消失，关系随之失效
+        self.assertFalse(any(('Disease', '感冒') in edge[2:] for edge in self.client.edges))
+        self.assertMatchesFullSync(records)
+
+    def test_shared_node_refcount(self):
+        # 阿司匹林被感冒与肺炎共同引用，删掉其中一条记录后节点与另一条关系保留，全部删掉后节点才删除
+        self.sync(BASE)
+        self.sync(BASE[1:])
+        self.assertIn(('Drug', '阿司匹林'), self.client.nodes)
+        self.assertIn(self.edge('common_drug', '常用药品', ('Disease', '肺炎'), ('Drug', '阿司匹林')), self.client.edges)
+        records = [disease('肺炎', symptom=['发热'], common_drug=['头孢'], check=['胸部CT']), BASE[2]]
+        self.sync(records)
+        self.assertNotIn(('Drug', '阿司匹林'), self.client.nodes)
+        self.assertIn(('Drug', '头孢'), self.client.nodes)
+        self.assertMatchesFullSync(records)
+
+    def test_shared_edge_refcount(self):
+        # 同一药品明细出现在两条记录中：厂商-药品关系在两条记录都删除后才删除
+        records = [disease('感冒', common_drug=['阿司匹林'], drug_detail=['拜耳(阿司匹林)']),
+                   disease('头痛', common_drug=['阿司匹林'], drug_detail=['拜耳(阿司匹林)'])]
+        link = self.edge('drugs_of', '生产药品', ('Producer', '拜耳'), ('Drug', '阿司匹林'))
+        self.sync(records)
+        self.assertIn(link, self.client.edges)
+        plan = plan_sync(load_manifest(self.manifest_path), self.scan(records[1:]))
+        self.assertNotIn(('drug_producer', '拜耳', '阿司匹林'), plan.delete_edges)
+        self.sync(records[1:])
+        self.assertIn(link, self.client.edges)
+        self.sync([disease('头痛', common_drug=['阿司匹林'])])
+        self.assertNotIn(link, self.client.edges)
+        self.assertNotIn(('Producer', '拜耳'), self.client.nodes)
+
+    def test_manifest_version(self):
+        self.sync(BASE)
+        with open(self.manifest_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['version'], MANIFEST_VERSION)
+
+
+if __name__ == '__main__':
+    unittest.main()
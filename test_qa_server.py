@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: test_qa_server.py
+# qa_server的连接处理测试：用内存图谱在本进程内起服务，不需要Neo4j；python -m unittest test_qa_server
+
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from memory_graph import MemoryGraph
+from qa_server import PooledHTTPServer, QARequestHandler, build_service
+from question_classifier import QuestionClassifier
+from question_parser import QuestionPaser
+
+THREADS = 2
+RECORDS = [
+    {'name': '感冒', 'desc': '感冒的介绍', 'symptom': ['发热', '咳嗽'], 'common_drug': ['阿司匹林'],
+     'cure_way': ['药物治疗'], 'cure_lasttime': '1周', 'cured_prob': '90%', 'cure_department': ['内科']},
+]
+
+
+class QAServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        fd, data_path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for record in RECORDS:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        try:
+            graph = MemoryGraph.from_json(data_path)
+        finally:
+            os.remove(data_path)
+        cls.server = PooledHTTPServer(('127.0.0.1', 0), QARequestHandler)
+        cls.server.idle_timeout = 0.5
+        cls.server.start(build_service(QuestionClassifier(), QuestionPaser(), True, graph), THREADS)
+        cls.port = cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.server.pool.shutdown(wait=False)
+
+    def connect(self):
+        return http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+
+    def test_health_with_idle_connections(self):
+        # 占满线程池的空闲keep-alive连接应在超时后被关闭，新请求仍能得到应答
+        idle = []
+        for _ in range(THREADS):
+            conn = self.connect()
+            conn.request('GET', '/health')
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual(response.status, 200)
+            idle.append(conn)
+        try:
+            conn = self.connect()
+            conn.request('GET', '/health')
+            response = conn.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(json.loads(response.read())['status'], 'ok')
+            conn.close()
+        finally:
+            for conn in idle:
+                conn.close()
+
+    def raw_request(self, data):
+        """发送原始请求字节，读到服务端关闭连接为止"""
+        with socket.create_connection(('127.0.0.1', self.port), timeout=5) as sock:
+            sock.sendall(data)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+
+    def test_unread_body_not_parsed_as_request(self):
+        # 404与请求体过大时不读请求体，连接应随应答关闭，请求体不能被当作下一个请求
+        smuggled = b'GET /health HTTP/1.1\r\nHost: x\r\n\r\n'
+        requests = [
+            b'POST /nope HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n' % len(smuggled),
+            b'POST /ask HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n' % ((1 << 20) + 1),
+        ]
+        for head in requests:
+            reply = self.raw_request(head + smuggled)
+            self.assertEqual(reply.count(b'HTTP/1.1 '), 1, reply)
+            self.assertIn(b'Connection: close', reply)
+
+    def test_invalid_content_length(self):
+        for value in ('-1', 'abc', '1_0'):
+            reply = self.raw_request(b'POST /ask HTTP/1.1\r\nHost: x\r\nContent-Length: %s\r\n\r\n{}' % value.encode())
+            self.assertTrue(reply.startswith(b'HTTP/1.1 400 '), reply)
+            self.assertEqual(reply.count(b'HTTP/1.1 '), 1, reply)
+
+    def test_idle_connection_closed(self):
+        with socket.create_connection(('127.0.0.1', self.port), timeout=5) as sock:
+            self.assertEqual(sock.recv(1), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,11 @@
 # coding: utf-8
 # 测试版本 - 不使用Neo4j数据库
 
-import json
 import os
+from graph_file import open_medical_records
+from record_store import LazyRecordStore
 from question_classifier import QuestionClassifier
-from question_parser import QuestionPaser
+from question_parser import QuestionPaser, CYPHER_TEMPLATES
 
 class MockAnswerSearcher:
     """模拟答案搜索器，用于测试"""
@@ -15,18 +16,17 @@ class MockAnswerSearcher:
         self.medical_data = self.load_medical_data()
     
     def load_medical_data(self):
-        """加载医疗数据"""
+        """加载医疗数据：优先mmap打开编译好的data/medical.graph(python graph_file.py生成)，
+        不存在或已过期时按偏移索引从medical.json中按需读取记录"""
         data_path = os.path.join(os.path.dirname(__file__), 'data/medical.json')
-        medical_data = {}
+        medical_data = open_medical_records(data_path)
+        if medical_data is not None:
+            return medical_data
         try:
-            with open(data_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        disease_data = json.loads(line)
-                        medical_data[disease_data['name']] = disease_data
+            return LazyRecordStore(data_path)
         except Exception as e:
             print(f"加载医疗数据失败: {e}")
-        return medical_data
+        return {}
     
     def search_main(self, sqls):
         """模拟搜索主函数"""
@@ -51,11 +51,10 @@ class MockAnswerSearcher:
     
     def extract_disease_name_from_query(self, query):
         """从查询中提取疾病名称"""
-        # 简单的字符串匹配
-        if "m.name = '" in query:
-            start = query.find("m.name = '") + 10
-            end = query.find("'", start)
-            return query[start:end]
+        # 只处理以疾病名为查询条件的模板
+        template_id, params = query
+        if "m.name = $name" in CYPHER_TEMPLATES[template_id]:
+            return params['name']
         return None
     
     def format_disease_data(self, disease_data, question_type):
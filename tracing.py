@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# File: tracing.py
+# 问答流水线的分阶段计时：各阶段(分类、解析、每条图谱查询、回复生成)按(阶段, 标签)记入延迟直方图并计数，
+# 可选把每个问句的阶段耗时交给导出器(日志行、JSON文件)，Prometheus文本由qa_server的/metrics输出；
+# 未开启时热路径上的插桩点只检查一次TRACER.enabled，stage()/trace()返回共享的空上下文
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+from file_util import atomic_write
+from metrics import DEFAULT_BUCKETS, LatencyHistogram, format_labels
+
+# 各阶段标签在Prometheus输出中的标签名
+STAGE_LABELS = {'query': 'query', 'search': 'question_type', 'prettify': 'question_type'}
+# 分类、解析等进程内阶段只有几十微秒，分桶在默认上界前补充亚毫秒级的桶
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005) + DEFAULT_BUCKETS
+# JSON快照中给出的分位数
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class NullSpan:
+    """未开启追踪时的空计时器"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, label):
+        self.tracer = tracer
+        self.name = name
+        self.label = label
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.observe(self.name, self.label, time.perf_counter() - self.start)
+
+
+class TraceSpan(Span):
+    """一次问答的根计时：期间本线程内各阶段的耗时被收集起来，结束后交给导出器；已在追踪中时等同普通阶段"""
+    def __enter__(self):
+        local = self.tracer.local
+        self.root = getattr(local, 'records', None) is None
+        if self.root:
+            local.records = []
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if not self.root:
+            self.tracer.observe(self.name, self.label, seconds)
+            return
+        records = self.tracer.local.records
+        self.tracer.local.records = None
+        self.tracer.observe(self.name, self.label, seconds)
+        for exporter in self.tracer.exporters:
+            on_trace = getattr(exporter, 'on_trace', None)
+            if on_trace is not None:
+                on_trace(self.name, seconds, records, exc_type is not None)
+
+
+class Tracer:
+    """阶段计时与计数的注册表，可跨线程使用；AsyncChatBotGraph在线程池中执行的查询计入汇总，但不计入所属问句的追踪记录"""
+    def __init__(self):
+        self.enabled = False
+        self.exporters = []
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, *exporters):
+        self.exporters = list(exporters)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def stage(self, name, label=None):
+        """with tracer.stage('query', template_id): ... 计时一个阶段"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, label)
+
+    def trace(self, name='question'):
+        if not self.enabled:
+            return NULL_SPAN
+        return TraceSpan(self, name, None)
+
+    def observe(self, name, label, seconds):
+        key = (name, label)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram(STAGE_BUCKETS))
+        histogram.observe(seconds)
+        records = getattr(self.local, 'records', None)
+        if records is not None:
+            records.append((name, label, seconds))
+
+    def incr(self, name, label=None, value=1):
+        if not self.enabled:
+            return
+        key = (name, label)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self):
+        """JSON可序列化的汇总：各阶段的次数、总耗时、分位数(分桶上界)与分桶计数，以及各计数器"""
+        with self.lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: (item[0][0], str(item[0][1])))
+            counters = sorted(self.counters.items(), key=lambda item: (item[0][0], str(item[0][1])))
+        stages = []
+        for (name, label), histogram in histograms:
+            snap = histogram.snapshot()
+            stage = {'stage': name, 'label': label, 'count': snap['count'], 'sum': snap['sum']}
+            for q in QUANTILES:
+                stage['p%d' % round(q * 100)] = histogram.quantile(q)
+            stage['buckets'] = snap['buckets']
+            stage['counts'] = snap['counts']
+            stages.append(stage)
+        return {
+            'pid': os.getpid(),
+            'time': time.time(),
+            'stages': stages,
+            'counters': [{'name': name, 'label': label, 'value': value} for (name, label), value in counters],
+        }
+
+    def render_prometheus(self, labels=None):
+        """Prometheus文本：qa_stage_latency_seconds直方图与qa_<计数器>_total"""
+        labels = dict(labels or {})
+        with self.lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: (item[0][0], str(item[0][1])))
+            counters = sorted(self.counters.items(), key=lambda item: (item[0][0], str(item[0][1])))
+        lines = []
+        if histograms:
+            lines.append('# TYPE qa_stage_latency_seconds histogram')
+        for (name, label), histogram in histograms:
+            stage_labels = dict(labels, stage=name)
+            if label is not None:
+                stage_labels[STAGE_LABELS.get(name, 'label')] = label
+            lines.append(histogram.render_prometheus('qa_stage_latency_seconds', stage_labels))
+        for (name, label), value in counters:
+            counter_labels = dict(labels) if label is None else dict(labels, label=label)
+            lines.append('qa_%s_total%s %d' % (name, format_labels(counter_labels), value))
+        return '\n'.join(lines)
+
+    def flush(self):
+        """让带export方法的导出器(如JSONExporter)写出当前汇总"""
+        for exporter in self.exporters:
+            export = getattr(exporter, 'export', None)
+            if export is not None:
+                export(self)
+
+
+class LogExporter:
+    """每个问句写一行：总耗时与各阶段耗时"""
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def on_trace(self, name, seconds, records, failed):
+        parts = ['trace %s %.2fms' % (name, seconds * 1e3)]
+        for stage, label, stage_seconds in records:
+            key = stage if label is None else '%s[%s]' % (stage, label)
+            parts.append('%s=%.2fms' % (key, stage_seconds * 1e3))
+        if failed:
+            parts.append('error')
+        with self.lock:
+            print(' '.join(parts), file=self.stream or sys.stderr)
+
+
+class JSONExporter:
+    """把汇总写成JSON文件，路径中的{pid}替换为进程号，多进程服务时各工作进程写各自的文件"""
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, tracer):
+        path = self.path.format(pid=os.getpid())
+        with atomic_write(path) as f:
+            json.dump(tracer.snapshot(), f, ensure_ascii=False)
+
+
+# 进程内共享的追踪器，各模块的插桩点都使用它
+TRACER = Tracer()
+
+
+def configure(spec, tracer=TRACER):
+    """按逗号分隔的配置开启追踪：on(只汇总)、log(每问句写一行到stderr)、json=路径(退出时写出汇总)；空串或off关闭"""
+    items = [item.strip() for item in (spec or '').split(',') if item.strip()]
+    if not items or items == ['off']:
+        tracer.disable()
+        return tracer
+    exporters = []
+    for item in items:
+        if item == 'on':
+            continue
+        if item == 'log':
+            exporters.append(LogExporter())
+        elif item.startswith('json='):
+            exporters.append(JSONExporter(item[len('json='):]))
+        else:
+            raise ValueError('unknown trace option: %s' % item)
+    tracer.enable(*exporters)
+    return tracer
+
+
+atexit.register(lambda: TRACER.enabled and TRACER.flush())
+# 环境变量配置有误时只提示，不让导入本模块的服务与脚本失败；命令行--trace的错误仍直接报出
+try:
+    configure(os.environ.get('QA_TRACE'))
+except ValueError as e:
+    TRACER.disable()
+    print('ignoring QA_TRACE: %s, tracing disabled' % e, file=sys.stderr)